@@ -2,15 +2,32 @@
 Chat API endpoints
 """
 
+import asyncio
+import json
 import logging
-from typing import List, Literal, Optional
+import time
+from contextlib import aclosing, suppress
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
 import redis.asyncio as redis
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from pydantic import BaseModel, Field, ValidationError
 
+from app.core.config import settings
 from app.core.redis_client import get_redis_client
-from app.services.ai_provider import AIProviderService
+from app.core.security import Identity, get_identity, get_ws_identity
+from app.services.ai_provider import DEFAULT_MODELS, AIProviderService
+from app.services.answer_store import AnswerStoreWatcher, get_answer_store
+from app.services.concurrency_limiter import ConcurrencyLimitExceeded
+from app.services.traffic_capture import TrafficRecorder, get_traffic_recorder
+from app.services.usage_ledger import UsageLedger, get_usage_ledger
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -44,20 +61,53 @@ class ChatResponse(BaseModel):
 
 
 @router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest, redis_client: redis.Redis = Depends(get_redis_client)):
+async def chat(
+    request: ChatRequest,
+    redis_client: redis.Redis = Depends(get_redis_client),
+    usage_ledger: UsageLedger = Depends(get_usage_ledger),
+    traffic_recorder: Optional[TrafficRecorder] = Depends(get_traffic_recorder),
+    answer_store: Optional[AnswerStoreWatcher] = Depends(get_answer_store),
+    identity: Identity = Depends(get_identity),
+):
     """
     Chat endpoint - proxy to AI providers
 
     Supports:
     - OpenAI (GPT-4, GPT-3.5-turbo)
     - Anthropic (Claude)
+
+    Token usage is recorded per user and tenant (from the bearer JWT) in the usage ledger.
+    Canonical starter questions are answered from the precomputed answer store.
     """
+    # Convert messages to dict
+    messages = [msg.model_dump() for msg in request.messages]
+
+    if answer_store is not None:
+        answer = answer_store.lookup(
+            messages,
+            provider=request.provider,
+            model=request.model,
+            max_tokens=request.max_tokens,
+        )
+        if answer is not None:
+            return ChatResponse(
+                message=answer["message"],
+                provider=answer["provider"],
+                model=answer["model"],
+                usage={"precomputed": True, "store_version": answer["version"]},
+            )
+
+    if not usage_ledger.check_quota(identity):
+        raise HTTPException(status_code=429, detail="Token quota exceeded")
+
+    arrived_at = time.time()
+    status_code = 200
+    usage: Dict[str, Any] = {}
+    ai_service: Optional[AIProviderService] = None
+
     try:
         ai_service = AIProviderService()
 
-        # Convert messages to dict
-        messages = [msg.model_dump() for msg in request.messages]
-
         # Get response from AI provider
         response = await ai_service.get_completion(
             messages=messages,
@@ -67,6 +117,9 @@ async def chat(request: ChatRequest, redis_client: redis.Redis = Depends(get_red
             max_tokens=request.max_tokens,  # type: ignore[arg-type]
         )
 
+        usage = response.get("usage", {})
+        usage_ledger.record(identity, response["provider"], response["model"], usage)
+
         logger.info(
             f"Chat request processed: provider={request.provider}, model={response.get('model')}"
         )
@@ -75,15 +128,224 @@ async def chat(request: ChatRequest, redis_client: redis.Redis = Depends(get_red
             message=response["message"],
             provider=response["provider"],
             model=response["model"],
-            usage=response.get("usage", {}),
+            usage=usage,
         )
 
     except ValueError as e:
         logger.error(f"Invalid request: {str(e)}")
+        status_code = 400
         raise HTTPException(status_code=400, detail=str(e))
+    except ConcurrencyLimitExceeded as e:
+        logger.warning(f"Upstream busy: {str(e)}")
+        status_code = 503
+        raise HTTPException(status_code=503, detail="AI provider busy, please retry")
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
+        status_code = 500
         raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        if traffic_recorder is not None:
+            traffic_recorder.record(
+                arrived_at=arrived_at,
+                transport="http",
+                messages=messages,
+                provider=request.provider,
+                model=request.model,
+                stream=request.stream,
+                max_tokens=request.max_tokens,
+                upstream_ms=ai_service.upstream_ms if ai_service is not None else 0.0,
+                status=status_code,
+                usage=usage,
+            )
+
+
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    provider: str = Query(default="openai"),
+    model: Optional[str] = Query(default=None),
+    temperature: float = Query(default=0.7, ge=0.0, le=2.0),
+    max_tokens: int = Query(default=1000, ge=1, le=4000),
+    usage_ledger: UsageLedger = Depends(get_usage_ledger),
+    traffic_recorder: Optional[TrafficRecorder] = Depends(get_traffic_recorder),
+    identity: Identity = Depends(get_ws_identity),
+):
+    """
+    Chat WebSocket - persistent conversation with streamed responses
+
+    Provider settings are fixed per connection via query parameters and the
+    conversation history is kept server-side, so each turn only sends new text.
+    The caller's JWT is passed as the 'token' query parameter or a bearer header.
+
+    Client frames:
+    - {"type": "message", "content": "..."} - add a user message and generate a reply
+    - {"type": "cancel"} - stop the in-progress generation
+    - {"type": "reset", "messages": [...]} - replace the conversation history
+
+    Server frames: "token" (text delta), "done" (provider, model, usage),
+    "cancelled" and "error" (detail). A cancelled reply is kept in the history
+    only as far as it was sent, and its usage is recorded from an estimate. A turn
+    that ends in an error is removed from the history, message and partial reply.
+    """
+    await websocket.accept()
+
+    ai_service = AIProviderService()
+    history: List[Dict[str, str]] = []
+    # Bounded so a slow reader stalls generation instead of buffering without limit.
+    # Items are (reply, frame): token frames carry the list of their reply's text
+    # that has been handed to the client, so a cancelled reply keeps only that.
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.CHAT_WS_SEND_BUFFER)
+    generation: Optional[asyncio.Task] = None
+    reply: List[str] = []
+
+    async def send_frames():
+        held: Optional[Tuple[Optional[List[str]], Dict[str, Any]]] = None
+        while True:
+            sent, frame = held or await outbox.get()
+            held = None
+            if sent is not None:
+                # Coalesce tokens of the same reply that queued up while the client was reading
+                parts = [frame["content"]]
+                while not outbox.empty():
+                    queued = outbox.get_nowait()
+                    if queued[0] is not sent:
+                        held = queued
+                        break
+                    parts.append(queued[1]["content"])
+                frame = {"type": "token", "content": "".join(parts)}
+                sent.extend(parts)
+            await websocket.send_json(frame)
+
+    async def generate(messages: List[Dict[str, str]], sent: List[str]):
+        parts: List[str] = []
+        arrived_at = time.time()
+        status_code = 200
+        usage: Dict[str, Any] = {}
+        try:
+            # Closed on cancel, so the upstream stream ends and reports its latency
+            async with aclosing(
+                ai_service.stream_completion(
+                    messages=messages,
+                    provider=provider,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+            ) as events:
+                async for event in events:
+                    if event["type"] == "token":
+                        parts.append(event["content"])
+                    else:
+                        usage = event["usage"]
+                        usage_ledger.record(identity, event["provider"], event["model"], usage)
+                    await outbox.put((sent if event["type"] == "token" else None, event))
+        except asyncio.CancelledError:
+            status_code = 499
+            if not usage:
+                # The provider reports usage only at the end; estimate what was generated
+                usage = {
+                    "input_tokens": sum(len(msg["content"]) for msg in messages) // 4,
+                    "output_tokens": len("".join(parts)) // 4,
+                    "estimated": True,
+                }
+                usage_ledger.record(identity, provider, model or DEFAULT_MODELS[provider], usage)
+            raise
+        except ValueError as e:
+            logger.error(f"Invalid request: {str(e)}")
+            status_code = 400
+            await outbox.put((None, {"type": "error", "detail": str(e)}))
+        except ConcurrencyLimitExceeded as e:
+            logger.warning(f"Upstream busy: {str(e)}")
+            status_code = 503
+            await outbox.put((None, {"type": "error", "detail": "AI provider busy, please retry"}))
+        except Exception as e:
+            logger.error(f"Chat error: {str(e)}")
+            status_code = 500
+            await outbox.put((None, {"type": "error", "detail": "Internal server error"}))
+        finally:
+            # A cancelled reply is added by the cancel handler with only the text sent
+            if status_code == 200 and parts:
+                history.append({"role": "assistant", "content": "".join(parts)})
+            elif status_code != 499 and history and history[-1] is messages[-1]:
+                # No usable reply: drop the unanswered message so the client can resend it
+                history.pop()
+            if traffic_recorder is not None:
+                traffic_recorder.record(
+                    arrived_at=arrived_at,
+                    transport="ws",
+                    messages=messages,
+                    provider=provider,
+                    model=model,
+                    stream=True,
+                    max_tokens=max_tokens,
+                    upstream_ms=ai_service.upstream_ms,
+                    status=status_code,
+                    usage=usage,
+                )
+
+    sender = asyncio.create_task(send_frames())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            try:
+                # Binary frames carry no text and are rejected like malformed JSON
+                frame = json.loads(message.get("text") or "")
+                frame_type = frame.get("type")
+            except (ValueError, AttributeError):
+                await outbox.put((None, {"type": "error", "detail": "Invalid frame"}))
+                continue
+
+            busy = generation is not None and not generation.done()
+
+            if frame_type == "cancel":
+                if busy:
+                    generation.cancel()  # type: ignore[union-attr]
+                    with suppress(asyncio.CancelledError):
+                        await generation  # type: ignore[misc]
+                    # Drop tokens the client has not received yet
+                    queued = [outbox.get_nowait() for _ in range(outbox.qsize())]
+                    for item in queued:
+                        if item[0] is not reply:
+                            outbox.put_nowait(item)
+                    if reply:
+                        history.append({"role": "assistant", "content": "".join(reply)})
+                    await outbox.put((None, {"type": "cancelled"}))
+            elif busy:
+                await outbox.put(
+                    (None, {"type": "error", "detail": "Generation already in progress"})
+                )
+            elif frame_type == "message":
+                content = frame.get("content")
+                if not isinstance(content, str) or not content:
+                    await outbox.put(
+                        (None, {"type": "error", "detail": "Message content required"})
+                    )
+                elif not usage_ledger.check_quota(identity):
+                    await outbox.put((None, {"type": "error", "detail": "Token quota exceeded"}))
+                else:
+                    history.append({"role": "user", "content": content})
+                    reply = []
+                    generation = asyncio.create_task(generate(list(history), reply))
+            elif frame_type == "reset":
+                try:
+                    messages = [Message(**msg).model_dump() for msg in frame.get("messages", [])]
+                except (ValidationError, TypeError):
+                    await outbox.put((None, {"type": "error", "detail": "Invalid messages"}))
+                    continue
+                history[:] = messages
+            else:
+                await outbox.put(
+                    (None, {"type": "error", "detail": f"Unknown frame type: {frame_type}"})
+                )
+    except WebSocketDisconnect:
+        logger.info("Chat WebSocket disconnected")
+    finally:
+        tasks = [task for task in (generation, sender) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 @router.get("/models")
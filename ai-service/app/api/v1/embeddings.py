@@ -0,0 +1,133 @@
+"""
+Embeddings API endpoints
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional, Union
+
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field, field_validator
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+from app.services.ai_provider import DEFAULT_EMBEDDING_MODELS
+from app.services.concurrency_limiter import ConcurrencyLimitExceeded
+from app.services.embedding_batcher import EmbeddingBatcher, get_embedding_batcher
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MAX_INPUTS = 256
+
+
+class EmbeddingRequest(BaseModel):
+    """Embedding request model"""
+
+    input: Union[str, List[str]] = Field(description="Text or list of texts to embed")
+    provider: str = Field(default="openai", description="Embedding provider (openai, ollama)")
+    model: Optional[str] = Field(default=None, description="Model name")
+
+    @field_validator("input")
+    @classmethod
+    def check_texts(cls, value: Union[str, List[str]]) -> Union[str, List[str]]:
+        """Reject inputs that would fail the upstream batch they are coalesced into"""
+        texts = [value] if isinstance(value, str) else value
+        if not 1 <= len(texts) <= MAX_INPUTS:
+            raise ValueError(f"Provide 1 to {MAX_INPUTS} texts")
+        for text in texts:
+            if not text.strip():
+                raise ValueError("Texts must not be empty")
+            if len(text) > settings.EMBEDDING_MAX_CHARS:
+                raise ValueError(f"Texts must be at most {settings.EMBEDDING_MAX_CHARS} characters")
+        return value
+
+
+class EmbeddingResponse(BaseModel):
+    """Embedding response model"""
+
+    embeddings: List[List[float]]
+    provider: str
+    model: str
+    cached: int
+
+
+def cache_key(provider: str, model: str, text: str) -> str:
+    """Redis key for a cached embedding"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"embedding:{provider}:{model}:{digest}"
+
+
+@router.post("/", response_model=EmbeddingResponse)
+async def create_embeddings(
+    request: EmbeddingRequest,
+    redis_client: redis.Redis = Depends(get_redis_client),
+    batcher: EmbeddingBatcher = Depends(get_embedding_batcher),
+):
+    """
+    Embeddings endpoint - OpenAI and Ollama
+
+    Texts already embedded are served from the Redis cache; the rest are
+    micro-batched with other concurrent requests into shared upstream calls.
+    """
+    texts = [request.input] if isinstance(request.input, str) else request.input
+    if request.provider not in DEFAULT_EMBEDDING_MODELS:
+        raise HTTPException(
+            status_code=400, detail=f"Unsupported embedding provider: {request.provider}"
+        )
+
+    provider = request.provider
+    model = request.model or DEFAULT_EMBEDDING_MODELS[provider]
+    unique = list(dict.fromkeys(texts))
+    keys = [cache_key(provider, model, text) for text in unique]
+
+    vectors: Dict[str, List[float]] = {}
+    try:
+        for text, cached in zip(unique, await redis_client.mget(keys)):
+            if cached is not None:
+                vectors[text] = json.loads(cached)
+    except Exception as e:
+        logger.warning(f"Embedding cache unavailable: {str(e)}")
+    cached_count = len(vectors)
+
+    misses = [text for text in unique if text not in vectors]
+    try:
+        results = await asyncio.gather(*(batcher.embed(text, provider, model) for text in misses))
+    except ValueError as e:
+        logger.error(f"Invalid request: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except ConcurrencyLimitExceeded as e:
+        logger.warning(f"Upstream busy: {str(e)}")
+        raise HTTPException(status_code=503, detail="AI provider busy, please retry")
+    except Exception as e:
+        logger.error(f"Embedding error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    if misses:
+        vectors.update(zip(misses, results))
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for text in misses:
+                pipe.set(
+                    cache_key(provider, model, text),
+                    json.dumps(vectors[text]),
+                    ex=settings.EMBEDDING_CACHE_TTL,
+                )
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache embeddings: {str(e)}")
+
+    logger.info(
+        f"Embeddings processed: provider={provider}, model={model}, "
+        f"texts={len(texts)}, cached={cached_count}"
+    )
+
+    return EmbeddingResponse(
+        embeddings=[vectors[text] for text in texts],
+        provider=provider,
+        model=model,
+        cached=cached_count,
+    )
@@ -9,6 +9,7 @@ from fastapi import APIRouter, Depends
 
 from app.core.redis_client import get_redis_client
 from app.core.config import settings
+from app.services.concurrency_limiter import limiter_stats
 
 router = APIRouter()
 
@@ -66,6 +67,14 @@ async def readiness_check(redis_client: redis.Redis = Depends(get_redis_client))
         return {"status": "not ready"}
 
 
+@router.get("/metrics")
+async def metrics():
+    """
+    Runtime metrics - learned upstream concurrency limits per provider/model
+    """
+    return {"concurrency_limits": limiter_stats()}
+
+
 @router.get("/live")
 async def liveness_check():
     """
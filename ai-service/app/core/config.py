@@ -26,17 +26,52 @@ class Settings(BaseSettings):
 
     # AI Providers - Local AI only
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OPENAI_API_KEY: Optional[str] = None
+    ANTHROPIC_API_KEY: Optional[str] = None
     DEFAULT_PROVIDER: str = "ollama"
     DEFAULT_MODEL: str = "llama2"  # or mistral, codellama, etc.
+    PROMPT_CACHE_ENABLED: bool = True  # mark system prompts for provider prompt caching
 
     # Rate limiting
     RATE_LIMIT_REQUESTS: int = 100
     RATE_LIMIT_PERIOD: int = 60  # seconds
 
+    # Adaptive upstream concurrency (per provider/model)
+    CONCURRENCY_INITIAL_LIMIT: int = 4
+    CONCURRENCY_MIN_LIMIT: int = 1
+    CONCURRENCY_MAX_LIMIT: int = 100
+    CONCURRENCY_LATENCY_TOLERANCE: float = 2.0  # x baseline latency before backing off
+    CONCURRENCY_QUEUE_TIMEOUT_MS: int = 2000
+    CONCURRENCY_MAX_LIMITERS: int = 64  # provider/model limiters kept in memory
+
+    # Usage ledger
+    USAGE_FLUSH_INTERVAL_MS: int = 500
+    USAGE_FLUSH_MAX_EVENTS: int = 100
+    USAGE_QUOTA_TOKENS: int = 0  # monthly tokens per user, 0 = unlimited
+    USAGE_TENANT_QUOTA_TOKENS: int = 0  # monthly tokens per tenant, 0 = unlimited
+
+    # Traffic capture for load replay (disabled unless a path is set)
+    CAPTURE_PATH: Optional[str] = None  # e.g. /data/capture.jsonl.gz
+    CAPTURE_FLUSH_INTERVAL_MS: int = 5000
+
+    # Precomputed answers for starter questions (disabled unless a path is set)
+    ANSWER_STORE_PATH: Optional[str] = None
+    ANSWER_STORE_CHECK_INTERVAL: float = 5.0  # seconds between checks for a new store
+
+    # Embeddings
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+    EMBEDDING_BATCH_MAX_WAIT_MS: int = 5
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600  # 1 week
+    EMBEDDING_MAX_CHARS: int = 8000  # per text, keeps inputs within model context limits
+
+    # Chat WebSocket
+    CHAT_WS_SEND_BUFFER: int = 64  # queued frames before generation waits on the client
+
     # Security - JWT Secret loaded from Vault if enabled
     JWT_SECRET: str = "fallback-secret-only-for-testing"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION: int = 3600
+    REQUIRE_AUTH: bool = False  # reject requests without a valid JWT instead of anonymous
 
     class Config:
         env_file = ".env.vault"
@@ -74,4 +109,3 @@ settings = Settings()
 # Load secrets from Vault on startup
 if settings.USE_VAULT:
     settings.load_from_vault()
-
@@ -0,0 +1,78 @@
+"""
+Request identity from JWTs signed with the shared JWT secret
+"""
+
+from typing import Optional
+
+import jwt
+from fastapi import Header, HTTPException, Query, WebSocketException, status
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+
+class Identity(BaseModel):
+    """Authenticated caller used for quotas and usage accounting"""
+
+    user_id: str
+    tenant_id: str
+
+
+# Unauthenticated callers share one bucket; set REQUIRE_AUTH to reject them instead
+ANONYMOUS = Identity(user_id="anonymous", tenant_id="public")
+
+
+def decode_token(token: str) -> Identity:
+    """
+    Verify a JWT and read the caller from its claims
+
+    'sub' is the user and 'tenant' the tenant (defaults to 'default').
+    Raises ValueError if the token is invalid, expired or has no subject.
+    """
+    try:
+        claims = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except jwt.PyJWTError as e:
+        raise ValueError(f"Invalid token: {str(e)}")
+    if not claims.get("sub"):
+        raise ValueError("Invalid token: missing subject")
+    return Identity(user_id=str(claims["sub"]), tenant_id=str(claims.get("tenant", "default")))
+
+
+def _resolve(token: Optional[str]) -> Optional[Identity]:
+    """Identity for a token, ANONYMOUS without one, or None if the caller must be rejected"""
+    if not token:
+        return None if settings.REQUIRE_AUTH else ANONYMOUS
+    try:
+        return decode_token(token)
+    except ValueError:
+        return None
+
+
+def _bearer(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return None
+
+
+async def get_identity(authorization: Optional[str] = Header(default=None)) -> Identity:
+    """Caller identity from an 'Authorization: Bearer <jwt>' header"""
+    identity = _resolve(_bearer(authorization))
+    if identity is None:
+        raise HTTPException(status_code=401, detail="Invalid or missing token")
+    return identity
+
+
+async def get_ws_identity(
+    token: Optional[str] = Query(default=None),
+    authorization: Optional[str] = Header(default=None),
+) -> Identity:
+    """
+    Caller identity for WebSocket handshakes
+
+    Browsers cannot set headers on a WebSocket handshake, so the JWT may also be
+    passed as the 'token' query parameter.
+    """
+    identity = _resolve(token or _bearer(authorization))
+    if identity is None:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid token")
+    return identity
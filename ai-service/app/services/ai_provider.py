@@ -3,15 +3,112 @@ AI Provider Service - handles communication with different AI providers
 """
 
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+import httpx
 from anthropic import AsyncAnthropic
 from openai import AsyncOpenAI
 
 from app.core.config import settings
+from app.services.concurrency_limiter import get_limiter
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODELS = {
+    "openai": "gpt-4",
+    "anthropic": "claude-3-sonnet-20240229",
+}
+
+DEFAULT_EMBEDDING_MODELS = {
+    "openai": "text-embedding-3-small",
+    "ollama": "nomic-embed-text",
+}
+
+
+def split_system_prompts(messages: List[Dict[str, str]]) -> Tuple[List[str], List[Dict[str, str]]]:
+    """
+    Separate the leading system prompts from the rest of the conversation
+
+    Only the run of system messages before the first user/assistant message is the
+    shared prompt. It is normalized (line endings, surrounding whitespace, empty
+    entries dropped) so the same prompt is byte-identical on every request, which
+    provider prompt caching needs to match the prefix. Later system messages are
+    left in the conversation, in place.
+    """
+    leading = 0
+    while leading < len(messages) and messages[leading]["role"] == "system":
+        leading += 1
+    system = [msg["content"].replace("\r\n", "\n").strip() for msg in messages[:leading]]
+    return [content for content in system if content], messages[leading:]
+
+
+def _openai_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Normalized system prompt first, so requests share the longest cacheable prefix"""
+    system, conversation = split_system_prompts(messages)
+    return [{"role": "system", "content": content} for content in system] + conversation
+
+
+def _anthropic_system(messages: List[Dict[str, str]]) -> Tuple[Any, List[Dict[str, str]]]:
+    """
+    System parameter, with the leading prompt marked for caching when enabled,
+    and the conversation
+
+    Anthropic only accepts system text outside the messages, so mid-conversation
+    system messages follow the cached prompt as a separate, uncached block.
+    """
+    system, conversation = split_system_prompts(messages)
+    later = [msg["content"].strip() for msg in conversation if msg["role"] == "system"]
+    later = [content for content in later if content]
+    chat_messages = [msg for msg in conversation if msg["role"] != "system"]
+    if not system and not later:
+        return None, chat_messages
+    if not settings.PROMPT_CACHE_ENABLED:
+        return "\n\n".join(system + later), chat_messages
+
+    blocks: List[Dict[str, Any]] = []
+    if system:
+        blocks.append(
+            {"type": "text", "text": "\n\n".join(system), "cache_control": {"type": "ephemeral"}}
+        )
+    if later:
+        blocks.append({"type": "text", "text": "\n\n".join(later)})
+    return blocks, chat_messages
+
+
+def _openai_usage(usage: Any) -> Dict[str, int]:
+    """OpenAI usage with automatic prefix cache hits split out"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens") or 0
+    else:
+        cached = getattr(details, "cached_tokens", None) or 0
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+        "cached_input_tokens": cached,
+        "uncached_input_tokens": usage.prompt_tokens - cached,
+    }
+
+
+def _anthropic_usage(usage: Any, output_tokens: Optional[int] = None) -> Dict[str, int]:
+    """Anthropic usage with cache reads and writes split out"""
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens if output_tokens is None else output_tokens,
+        "cache_creation_input_tokens": cache_creation,
+        "cached_input_tokens": cache_read,
+        # Anthropic's input_tokens excludes cache reads and writes
+        "uncached_input_tokens": usage.input_tokens + cache_creation,
+    }
+
+
+def _output_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    return usage.get("completion_tokens", usage.get("output_tokens"))
+
 
 class AIProviderService:
     """Service for interacting with AI providers"""
@@ -19,6 +116,8 @@ class AIProviderService:
     def __init__(self):
         self.openai_client = None
         self.anthropic_client = None
+        # Upstream time of the last completion, excluding time queued for a limiter slot
+        self.upstream_ms = 0.0
 
         if settings.OPENAI_API_KEY:
             self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
@@ -46,14 +145,125 @@ class AIProviderService:
 
         Returns:
             Dict with 'message', 'provider', 'model', and 'usage' keys
+
+        Raises:
+            ConcurrencyLimitExceeded: if the provider/model has no free slot in time
         """
         if provider == "openai":
-            return await self._openai_completion(messages, model, temperature, max_tokens)
+            completion = self._openai_completion
         elif provider == "anthropic":
-            return await self._anthropic_completion(messages, model, temperature, max_tokens)
+            completion = self._anthropic_completion
         else:
             raise ValueError(f"Unsupported provider: {provider}")
 
+        self.upstream_ms = 0.0
+        async with get_limiter(provider, model or DEFAULT_MODELS[provider]).acquire() as slot:
+            try:
+                response = await completion(messages, model, temperature, max_tokens)
+            finally:
+                self.upstream_ms = slot.upstream_time * 1000
+            slot.work = _output_tokens(response.get("usage", {}))
+            return response
+
+    async def stream_completion(
+        self,
+        messages: List[Dict[str, str]],
+        provider: str = "openai",
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream completion from specified AI provider
+
+        Yields {'type': 'token', 'content': str} for each text delta, then a final
+        {'type': 'done', 'provider', 'model', 'usage'} event. Closing the iterator
+        early closes the upstream stream.
+        """
+        if provider == "openai":
+            stream = self._openai_stream(messages, model, temperature, max_tokens)
+        elif provider == "anthropic":
+            stream = self._anthropic_stream(messages, model, temperature, max_tokens)
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+
+        self.upstream_ms = 0.0
+        async with get_limiter(provider, model or DEFAULT_MODELS[provider]).acquire() as slot:
+            # Only time spent waiting on the upstream counts, not on a slow consumer
+            slot.latency = 0.0
+            tokens = 0
+            try:
+                while True:
+                    started = time.monotonic()
+                    try:
+                        event = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    slot.latency += time.monotonic() - started
+                    if event["type"] == "token":
+                        tokens += 1
+                    else:
+                        tokens = _output_tokens(event["usage"]) or tokens
+                    slot.work = tokens
+                    yield event
+            finally:
+                self.upstream_ms = slot.upstream_time * 1000
+                await stream.aclose()
+
+    async def get_embeddings(
+        self,
+        texts: List[str],
+        provider: str = "openai",
+        model: Optional[str] = None,
+    ) -> List[List[float]]:
+        """
+        Get embeddings for a batch of texts in a single upstream call
+
+        Args:
+            texts: Texts to embed
+            provider: Embedding provider ('openai' or 'ollama')
+            model: Model name (provider-specific)
+
+        Returns:
+            One embedding vector per input text, in order
+        """
+        if provider == "openai":
+            embed = self._openai_embeddings
+        elif provider == "ollama":
+            embed = self._ollama_embeddings
+        else:
+            raise ValueError(f"Unsupported embedding provider: {provider}")
+
+        model = model or DEFAULT_EMBEDDING_MODELS[provider]
+        async with get_limiter(provider, model).acquire() as slot:
+            slot.work = len(texts)
+            return await embed(texts, model)
+
+    async def _openai_embeddings(self, texts: List[str], model: str) -> List[List[float]]:
+        """Get embeddings from OpenAI"""
+        if not self.openai_client:
+            raise ValueError("OpenAI API key not configured")
+
+        try:
+            response = await self.openai_client.embeddings.create(model=model, input=texts)
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except Exception as e:
+            logger.error(f"OpenAI API error: {str(e)}")
+            raise
+
+    async def _ollama_embeddings(self, texts: List[str], model: str) -> List[List[float]]:
+        """Get embeddings from a local Ollama server"""
+        try:
+            async with httpx.AsyncClient(base_url=settings.OLLAMA_BASE_URL) as client:
+                response = await client.post(
+                    "/api/embed", json={"model": model, "input": texts}, timeout=60.0
+                )
+                response.raise_for_status()
+                return response.json()["embeddings"]
+        except Exception as e:
+            logger.error(f"Ollama API error: {str(e)}")
+            raise
+
     async def _openai_completion(
         self,
         messages: List[Dict[str, str]],
@@ -65,12 +275,12 @@ class AIProviderService:
         if not self.openai_client:
             raise ValueError("OpenAI API key not configured")
 
-        model = model or "gpt-4"
+        model = model or DEFAULT_MODELS["openai"]
 
         try:
             response = await self.openai_client.chat.completions.create(
                 model=model,
-                messages=messages,  # type: ignore[arg-type]
+                messages=_openai_messages(messages),  # type: ignore[arg-type]
                 temperature=temperature,
                 max_tokens=max_tokens,
             )
@@ -79,16 +289,50 @@ class AIProviderService:
                 "message": response.choices[0].message.content,
                 "provider": "openai",
                 "model": model,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,  # type: ignore[union-attr]
-                    "completion_tokens": response.usage.completion_tokens,  # type: ignore[union-attr]
-                    "total_tokens": response.usage.total_tokens,  # type: ignore[union-attr]
-                },
+                "usage": _openai_usage(response.usage),
             }
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
 
+    async def _openai_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream completion from OpenAI"""
+        if not self.openai_client:
+            raise ValueError("OpenAI API key not configured")
+
+        model = model or DEFAULT_MODELS["openai"]
+
+        try:
+            stream = await self.openai_client.chat.completions.create(
+                model=model,
+                messages=_openai_messages(messages),  # type: ignore[arg-type]
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                # Ask for a final usage chunk so cache hits are reported for streams too
+                extra_body={"stream_options": {"include_usage": True}},
+            )
+            usage: Dict[str, int] = {}
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield {"type": "token", "content": chunk.choices[0].delta.content}
+                    if getattr(chunk, "usage", None):
+                        usage = _openai_usage(chunk.usage)  # type: ignore[attr-defined]
+            finally:
+                await stream.close()
+
+            yield {"type": "done", "provider": "openai", "model": model, "usage": usage}
+        except Exception as e:
+            logger.error(f"OpenAI API error: {str(e)}")
+            raise
+
     async def _anthropic_completion(
         self,
         messages: List[Dict[str, str]],
@@ -100,17 +344,10 @@ class AIProviderService:
         if not self.anthropic_client:
             raise ValueError("Anthropic API key not configured")
 
-        model = model or "claude-3-sonnet-20240229"
+        model = model or DEFAULT_MODELS["anthropic"]
 
-        # Extract system message if present
-        system_message = None
-        chat_messages = []
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                chat_messages.append(msg)
+        # Extract system messages, marked as a cacheable prefix
+        system_message, chat_messages = _anthropic_system(messages)
 
         try:
             response = await self.anthropic_client.messages.create(  # type: ignore[attr-defined]
@@ -125,11 +362,51 @@ class AIProviderService:
                 "message": response.content[0].text,
                 "provider": "anthropic",
                 "model": model,
-                "usage": {
-                    "input_tokens": response.usage.input_tokens,
-                    "output_tokens": response.usage.output_tokens,
-                },
+                "usage": _anthropic_usage(response.usage),
             }
         except Exception as e:
             logger.error(f"Anthropic API error: {str(e)}")
             raise
+
+    async def _anthropic_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream completion from Anthropic Claude"""
+        if not self.anthropic_client:
+            raise ValueError("Anthropic API key not configured")
+
+        model = model or DEFAULT_MODELS["anthropic"]
+
+        system_message, chat_messages = _anthropic_system(messages)
+        start_usage = None
+        output_tokens = 0
+
+        try:
+            stream = await self.anthropic_client.messages.create(  # type: ignore[attr-defined]
+                model=model,
+                messages=chat_messages,
+                system=system_message,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            try:
+                async for event in stream:
+                    if event.type == "content_block_delta":
+                        yield {"type": "token", "content": event.delta.text}
+                    elif event.type == "message_start":
+                        start_usage = event.message.usage
+                    elif event.type == "message_delta":
+                        output_tokens = event.usage.output_tokens
+            finally:
+                await stream.close()
+
+            usage = _anthropic_usage(start_usage, output_tokens) if start_usage else {}
+            yield {"type": "done", "provider": "anthropic", "model": model, "usage": usage}
+        except Exception as e:
+            logger.error(f"Anthropic API error: {str(e)}")
+            raise
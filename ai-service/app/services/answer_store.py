@@ -0,0 +1,200 @@
+"""
+Answer Store - precomputed answers for canonical starter questions
+
+A compact read-only file built by app.tools.build_answers and memory-mapped at
+runtime. Layout (little-endian):
+
+    header   magic b"OGA1", entry count (u32), version (u64)
+    index    count x (key hash u64, offset u32, length u32), sorted by hash
+    records  JSON blobs with the key, message, provider, model and output tokens
+
+Lookups binary-search the index in place, so serving an answer costs no upstream
+call, no Redis round trip and no load step. Replacing the file (atomic rename) is
+picked up on the next check without a restart.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ai_provider import split_system_prompts
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OGA1"
+HEADER = struct.Struct("<4sIQ")
+INDEX_ENTRY = struct.Struct("<QII")
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation insensitive form of a question"""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+def answer_key(messages: List[Dict[str, str]]) -> Optional[str]:
+    """
+    Store key for a conversation, or None if it cannot be a canonical question
+
+    Only a single user message (optionally after system messages) qualifies; the
+    system prompt, normalized as it is sent to providers, is part of the key so
+    answers built for one prompt are not served under another.
+    """
+    system, conversation = split_system_prompts(messages)
+    if len(conversation) != 1 or conversation[0]["role"] != "user":
+        return None
+    system_hash = hashlib.sha256("\n".join(system).encode("utf-8")).hexdigest()[:16]
+    return f"{system_hash}:{normalize_question(conversation[0]['content'])}"
+
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def write_store(path: str, answers: Dict[str, Dict[str, Any]], version: int) -> None:
+    """Write answers keyed by answer_key() to path, replacing any existing store atomically"""
+    records = []
+    for key, answer in answers.items():
+        blob = json.dumps({"key": key, **answer}, separators=(",", ":")).encode("utf-8")
+        records.append((_key_hash(key), blob))
+    records.sort(key=lambda record: record[0])
+
+    data_start = HEADER.size + INDEX_ENTRY.size * len(records)
+    index = bytearray()
+    data = bytearray()
+    for key_hash, blob in records:
+        index += INDEX_ENTRY.pack(key_hash, data_start + len(data), len(blob))
+        data += blob
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records), version))
+        f.write(index)
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AnswerStore:
+    """Memory-mapped answer store file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.version = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not an answer store: {path}")
+
+    def _entry(self, position: int) -> Tuple[int, int, int]:
+        return INDEX_ENTRY.unpack_from(self._mmap, HEADER.size + position * INDEX_ENTRY.size)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Answer for an exact key, or None"""
+        key_hash = _key_hash(key)
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._entry(mid)[0] < key_hash:
+                low = mid + 1
+            else:
+                high = mid
+
+        # Hash collisions are adjacent; confirm the full key
+        while low < self.count:
+            entry_hash, offset, length = self._entry(low)
+            if entry_hash != key_hash:
+                break
+            record = json.loads(self._mmap[offset : offset + length])
+            if record["key"] == key:
+                return record
+            low += 1
+        return None
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+class AnswerStoreWatcher:
+    """Serves lookups from the current store file and swaps in replacements"""
+
+    def __init__(self, path: str, check_interval: float = settings.ANSWER_STORE_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._store: Optional[AnswerStore] = None
+        self._identity: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        if identity == self._identity:
+            return
+
+        try:
+            store = AnswerStore(self.path)
+        except Exception as e:
+            logger.error(f"Failed to load answer store {self.path}: {str(e)}")
+            return
+
+        # Lookups never await, so nothing can be reading the old map here
+        if self._store is not None:
+            self._store.close()
+        self._store, self._identity = store, identity
+        logger.info(f"Loaded answer store version {store.version} ({store.count} answers)")
+
+    def lookup(
+        self,
+        messages: List[Dict[str, str]],
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Precomputed answer for a conversation, or None
+
+        The answer is only served if it came from the requested provider and model
+        (when given) and fits in max_tokens. Temperature is not matched: a stored
+        answer is one sample the request could have produced.
+        """
+        self._refresh()
+        if self._store is None:
+            return None
+        key = answer_key(messages)
+        if key is None:
+            return None
+        answer = self._store.get(key)
+        if answer is None:
+            return None
+        if provider is not None and provider != answer["provider"]:
+            return None
+        if model is not None and model != answer["model"]:
+            return None
+        if max_tokens is not None and max_tokens < answer.get("output_tokens", 0):
+            return None
+        answer["version"] = self._store.version
+        return answer
+
+
+_answer_store: Optional[AnswerStoreWatcher] = None
+
+
+def get_answer_store() -> Optional[AnswerStoreWatcher]:
+    """Get the answer store, or None when no store path is configured"""
+    global _answer_store
+    if _answer_store is None and settings.ANSWER_STORE_PATH:
+        _answer_store = AnswerStoreWatcher(settings.ANSWER_STORE_PATH)
+    return _answer_store
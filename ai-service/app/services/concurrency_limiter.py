@@ -0,0 +1,198 @@
+"""
+Adaptive Concurrency Limiter - learns how many concurrent requests each upstream can take
+
+Limits follow AIMD over observed latency and errors: each fast success grows the
+limit by roughly one per window, while slow responses or capacity errors (429,
+5xx, timeouts) cut it multiplicatively. Requests over the limit wait briefly for
+a slot, then fail.
+
+Latency is compared per unit of work (output tokens, embedded texts), since
+end-to-end time mostly tracks reply length, and a recent average is compared with
+a long-running one so the limit reacts to the upstream slowing down rather than
+to individual long replies.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# EWMA weights of the recent and baseline per-unit latency (roughly the last 10
+# and last 200 requests)
+RECENT_WEIGHT = 0.1
+BASELINE_WEIGHT = 0.005
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when no upstream slot frees up within the queue timeout"""
+
+
+def upstream_status(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider SDK or httpx error, if it carries one"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_capacity_error(error: BaseException) -> bool:
+    """True for errors that signal an overloaded upstream: 429, 5xx and timeouts"""
+    status = upstream_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+
+class LimiterSlot:
+    """
+    A held concurrency slot
+
+    Set latency to override the measured wall time, and work to the number of
+    units the call produced (e.g. output tokens) so latency is compared per unit.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+        self.work: Optional[int] = None
+
+    @property
+    def upstream_time(self) -> float:
+        """Seconds spent on the upstream call so far, excluding time queued for the slot"""
+        return self.latency if self.latency is not None else time.monotonic() - self.started
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit for a single provider/model"""
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = settings.CONCURRENCY_INITIAL_LIMIT,
+        min_limit: int = settings.CONCURRENCY_MIN_LIMIT,
+        max_limit: int = settings.CONCURRENCY_MAX_LIMIT,
+        latency_tolerance: float = settings.CONCURRENCY_LATENCY_TOLERANCE,
+        backoff_ratio: float = 0.9,
+        error_backoff_ratio: float = 0.5,
+        queue_timeout_ms: int = settings.CONCURRENCY_QUEUE_TIMEOUT_MS,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.error_backoff_ratio = error_backoff_ratio
+        self.queue_timeout = queue_timeout_ms / 1000
+
+        self.in_flight = 0
+        # Seconds per unit of work
+        self.recent_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        self.rejected = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, math.floor(self.limit))
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[LimiterSlot]:
+        """Hold a slot for the duration of an upstream call and learn from its outcome"""
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.in_flight < self.current_limit),
+                    timeout=self.queue_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise ConcurrencyLimitExceeded(
+                    f"Concurrency limit reached for {self.name} ({self.current_limit})"
+                )
+            self.in_flight += 1
+
+        slot = LimiterSlot()
+        try:
+            yield slot
+        except Exception as e:
+            # Request problems (4xx, validation) say nothing about upstream capacity
+            if is_capacity_error(e):
+                self._on_error()
+            raise
+        else:
+            self._on_success(slot.upstream_time / max(1, slot.work or 1))
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        if self.recent_latency is None or self.baseline_latency is None:
+            self.recent_latency = self.baseline_latency = latency
+        else:
+            self.recent_latency += (latency - self.recent_latency) * RECENT_WEIGHT
+            self.baseline_latency += (latency - self.baseline_latency) * BASELINE_WEIGHT
+
+        if self.recent_latency > self.baseline_latency * self.latency_tolerance:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        elif self.in_flight * 2 >= self.current_limit:
+            # Only grow while the current limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _on_error(self) -> None:
+        self.limit = max(self.min_limit, self.limit * self.error_backoff_ratio)
+        logger.warning(
+            f"Upstream error for {self.name}, concurrency limit now {self.current_limit}"
+        )
+
+    def stats(self) -> Dict[str, object]:
+        """Current limiter state for metrics"""
+        return {
+            "limit": self.current_limit,
+            "in_flight": self.in_flight,
+            "recent_latency_ms": (
+                round(self.recent_latency * 1000, 3) if self.recent_latency is not None else None
+            ),
+            "baseline_latency_ms": (
+                round(self.baseline_latency * 1000, 3)
+                if self.baseline_latency is not None
+                else None
+            ),
+            "rejected": self.rejected,
+        }
+
+
+# Least recently used first; model names come from requests, so the map is bounded
+_limiters: "OrderedDict[Tuple[str, str], AdaptiveConcurrencyLimiter]" = OrderedDict()
+
+
+def get_limiter(provider: str, model: str) -> AdaptiveConcurrencyLimiter:
+    """Get or create the limiter for a provider/model"""
+    key = (provider, model)
+    limiter = _limiters.get(key)
+    if limiter is not None:
+        _limiters.move_to_end(key)
+        return limiter
+
+    if len(_limiters) >= settings.CONCURRENCY_MAX_LIMITERS:
+        # Drop the least recently used idle limiter; one in use keeps its slots
+        for old_key, old in _limiters.items():
+            if old.in_flight == 0:
+                del _limiters[old_key]
+                break
+
+    limiter = _limiters[key] = AdaptiveConcurrencyLimiter(name=f"{provider}/{model}")
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, object]]:
+    """Stats for every limiter created so far, keyed by provider/model"""
+    return {limiter.name: limiter.stats() for limiter in _limiters.values()}
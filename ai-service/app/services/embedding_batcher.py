@@ -0,0 +1,118 @@
+"""
+Embedding Batcher - coalesces concurrent embedding requests into upstream batches
+
+Texts queued for the same provider/model within a short window (or until the
+batch is full) are sent as one upstream call, and each caller gets its own
+vector back. Identical texts in a batch are embedded once. If the upstream
+rejects a batch as a bad request (400/422), which one text can cause, its texts
+are retried one by one so a bad text only fails its own caller; any other error
+fails the whole batch at once.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from app.core.config import settings
+from app.services.ai_provider import AIProviderService
+from app.services.concurrency_limiter import upstream_status
+
+logger = logging.getLogger(__name__)
+
+BatchKey = Tuple[str, str]
+
+# Upstream statuses that can come from a single bad text rather than the whole call
+PER_TEXT_STATUSES = {400, 422}
+
+
+class EmbeddingBatcher:
+    """Micro-batches single-text embedding requests per provider/model"""
+
+    def __init__(
+        self,
+        max_batch_size: int = settings.EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms: int = settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: Dict[BatchKey, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+        self._running: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str, provider: str, model: str) -> List[float]:
+        """Embed one text as part of the next batch for its provider/model"""
+        key = (provider, model)
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((text, future))
+
+        if len(batch) >= self.max_batch_size:
+            self._dispatch(key)
+        elif len(batch) == 1:
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self.max_wait, self._dispatch, key
+            )
+
+        return await future
+
+    def _dispatch(self, key: BatchKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.create_task(self._run_batch(key, batch))
+            # Hold a reference so the task is not garbage collected mid-flight
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _embed(self, texts: List[str], provider: str, model: str) -> List[List[float]]:
+        vectors = await AIProviderService().get_embeddings(texts, provider, model)
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+    async def _run_batch(self, key: BatchKey, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        provider, model = key
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        outcomes: Dict[str, Union[List[float], BaseException]]
+
+        try:
+            outcomes = dict(zip(texts, await self._embed(texts, provider, model)))
+            logger.debug(f"Embedded batch of {len(texts)} texts for {provider}/{model}")
+        except Exception as e:
+            if len(texts) == 1 or upstream_status(e) not in PER_TEXT_STATUSES:
+                # Auth, unknown model, missing key or capacity: every text would fail alike
+                outcomes = {text: e for text in texts}
+            else:
+                logger.warning(
+                    f"Embedding batch of {len(texts)} failed, retrying texts singly: {str(e)}"
+                )
+                results = await asyncio.gather(
+                    *(self._embed([text], provider, model) for text in texts),
+                    return_exceptions=True,
+                )
+                outcomes = {
+                    text: result if isinstance(result, BaseException) else result[0]
+                    for text, result in zip(texts, results)
+                }
+
+        for text, future in batch:
+            if future.done():
+                continue
+            outcome = outcomes[text]
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Get or create the embedding batcher"""
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        _embedding_batcher = EmbeddingBatcher()
+    return _embedding_batcher
@@ -0,0 +1,128 @@
+"""
+Traffic Capture - records chat request shapes for load replay
+
+Each record holds timing and shape only: message roles, sizes and truncated
+content hashes, provider/model, stream flag, upstream latency and output tokens.
+Records are buffered and appended to a gzip file as one member per flush, so the
+file stays valid if the process dies between flushes.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.usage_ledger import normalize_usage
+
+logger = logging.getLogger(__name__)
+
+
+def message_shape(message: Dict[str, str]) -> Dict[str, Any]:
+    """Role, size and content hash of a message - never the content itself"""
+    content = message["content"]
+    return {
+        "role": message["role"],
+        "chars": len(content),
+        "sha256": hashlib.sha256(content.encode("utf-8")).hexdigest()[:16],
+    }
+
+
+def read_capture(path: str) -> List[Dict[str, Any]]:
+    """Read records from a capture file in arrival order"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+
+class TrafficRecorder:
+    """Buffers request records and appends them to a compressed capture file"""
+
+    def __init__(self, path: str, flush_interval_ms: int = settings.CAPTURE_FLUSH_INTERVAL_MS):
+        self.path = path
+        self.flush_interval = flush_interval_ms / 1000
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(
+        self,
+        arrived_at: float,
+        transport: str,
+        messages: List[Dict[str, str]],
+        provider: Optional[str],
+        model: Optional[str],
+        stream: bool,
+        max_tokens: Optional[int],
+        upstream_ms: float,
+        status: int,
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Buffer one request record (no I/O)"""
+        self._buffer.append(
+            {
+                "ts": arrived_at,
+                "transport": transport,
+                "provider": provider,
+                "model": model,
+                "stream": stream,
+                "max_tokens": max_tokens,
+                "messages": [message_shape(msg) for msg in messages],
+                "upstream_ms": round(upstream_ms, 1),
+                "output_tokens": normalize_usage(usage or {})["output_tokens"],
+                "status": status,
+            }
+        )
+
+    async def flush(self) -> None:
+        """Append buffered records to the capture file off the event loop"""
+        # One writer at a time, so gzip members are never appended concurrently
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(
+                    f"Traffic capture write failed, dropping {len(batch)} records: {str(e)}"
+                )
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch)
+        with gzip.open(self.path, "ab") as f:
+            f.write(lines.encode("utf-8"))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.shield(self.flush())
+
+    def start(self) -> None:
+        """Start the background flush task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write anything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+_traffic_recorder: Optional[TrafficRecorder] = None
+
+
+def get_traffic_recorder() -> Optional[TrafficRecorder]:
+    """Get the traffic recorder, or None when capture is disabled"""
+    global _traffic_recorder
+    if _traffic_recorder is None and settings.CAPTURE_PATH:
+        _traffic_recorder = TrafficRecorder(settings.CAPTURE_PATH)
+    return _traffic_recorder
@@ -0,0 +1,228 @@
+"""
+Usage Ledger - write-behind token accounting per user and tenant
+
+Token usage is aggregated in memory and flushed to Redis in pipelined
+batches, so recording usage never adds a Redis round trip to a chat request.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+from app.core.security import Identity
+
+logger = logging.getLogger(__name__)
+
+# Keep monthly counters a little past the end of the billing period
+USAGE_KEY_TTL = 40 * 24 * 3600
+
+
+def _period(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+
+
+def usage_key(tenant_id: str, user_id: Optional[str] = None, now: Optional[datetime] = None) -> str:
+    """Redis hash key holding a tenant's (or one of its users') counters for the month"""
+    if user_id is None:
+        return f"usage:{tenant_id}:{_period(now)}"
+    return f"usage:{tenant_id}:user:{user_id}:{_period(now)}"
+
+
+def normalize_usage(usage: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Map provider-specific usage dicts onto a common set of counters
+
+    OpenAI reports prompt/completion tokens, Anthropic reports input/output tokens.
+    Anthropic's input_tokens excludes prompt cache hits, so when the cached/uncached
+    split is present it is used for the input total.
+    """
+    cached_input_tokens = int(usage.get("cached_input_tokens", 0) or 0)
+    if "uncached_input_tokens" in usage:
+        input_tokens = int(usage["uncached_input_tokens"] or 0) + cached_input_tokens
+    else:
+        input_tokens = int(usage.get("input_tokens", usage.get("prompt_tokens", 0)) or 0)
+    output_tokens = int(usage.get("output_tokens", usage.get("completion_tokens", 0)) or 0)
+    total_tokens = int(usage.get("total_tokens", input_tokens + output_tokens) or 0)
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": total_tokens,
+        "cached_input_tokens": cached_input_tokens,
+    }
+
+
+class UsageLedger:
+    """In-memory usage buffer with batched Redis flushes and a cached quota snapshot"""
+
+    def __init__(
+        self,
+        flush_interval_ms: int = settings.USAGE_FLUSH_INTERVAL_MS,
+        flush_max_events: int = settings.USAGE_FLUSH_MAX_EVENTS,
+        quota_tokens: int = settings.USAGE_QUOTA_TOKENS,
+        tenant_quota_tokens: int = settings.USAGE_TENANT_QUOTA_TOKENS,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_events = flush_max_events
+        self.quota_tokens = quota_tokens
+        self.tenant_quota_tokens = tenant_quota_tokens
+
+        # Pending increments: redis key -> field -> amount
+        self._pending: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._pending_events = 0
+        # Last known Redis totals per key, refreshed from flush results
+        self._snapshot: Dict[str, int] = {}
+        # Tokens swapped out by a flush that has not completed yet
+        self._inflight: Dict[str, int] = {}
+        self._unloaded: Set[str] = set()
+
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, identity: Identity, provider: str, model: str, usage: Dict[str, Any]) -> None:
+        """Buffer usage for a completed request against the user and tenant (no I/O)"""
+        counters = normalize_usage(usage)
+
+        for key in (
+            usage_key(identity.tenant_id, identity.user_id),
+            usage_key(identity.tenant_id),
+        ):
+            pending = self._pending[key]
+            for field, amount in counters.items():
+                pending[field] += amount
+            pending["requests"] += 1
+            pending[f"{provider}:{model}:total_tokens"] += counters["total_tokens"]
+
+            if key not in self._snapshot:
+                self._unloaded.add(key)
+
+        self._pending_events += 1
+        if self._pending_events >= self.flush_max_events:
+            self._flush_requested.set()
+
+    def _used(self, key: str) -> int:
+        pending = self._pending.get(key)
+        return (
+            self._snapshot.get(key, 0)
+            + self._inflight.get(key, 0)
+            + (pending["total_tokens"] if pending else 0)
+        )
+
+    def used_tokens(self, identity: Identity) -> int:
+        """User's tokens this month: cached Redis total plus unflushed local usage"""
+        return self._used(usage_key(identity.tenant_id, identity.user_id))
+
+    def tenant_used_tokens(self, tenant_id: str) -> int:
+        """Tenant's tokens this month across all its users"""
+        return self._used(usage_key(tenant_id))
+
+    def _within(self, key: str, quota: int) -> bool:
+        if quota <= 0:
+            return True
+        if key not in self._snapshot:
+            # Load the Redis total on the next flush; allow until then
+            self._unloaded.add(key)
+        return self._used(key) < quota
+
+    def check_quota(self, identity: Identity) -> bool:
+        """Return True if the user and tenant may make another request (0 disables quotas)"""
+        return self._within(
+            usage_key(identity.tenant_id, identity.user_id), self.quota_tokens
+        ) and self._within(usage_key(identity.tenant_id), self.tenant_quota_tokens)
+
+    async def flush(self) -> None:
+        """Write pending counters to Redis in a single pipeline"""
+        async with self._flush_lock:
+            if not self._pending and not self._unloaded:
+                return
+
+            batch, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            to_load, self._unloaded = self._unloaded, set()
+            events, self._pending_events = self._pending_events, 0
+            self._flush_requested.clear()
+            self._inflight = {key: fields["total_tokens"] for key, fields in batch.items()}
+
+            try:
+                redis_client = await get_redis_client()
+                pipe = redis_client.pipeline(transaction=False)
+                ops = []
+                for key, fields in batch.items():
+                    for field, amount in fields.items():
+                        pipe.hincrby(key, field, amount)
+                        ops.append((key, field))
+                    pipe.expire(key, USAGE_KEY_TTL)
+                    ops.append((key, None))
+                load_keys = [key for key in to_load if key not in batch]
+                for key in load_keys:
+                    pipe.hget(key, "total_tokens")
+                results = await pipe.execute()
+            except Exception as e:
+                logger.error(f"Usage flush failed, retrying later: {str(e)}")
+                self._requeue(batch, events)
+                self._unloaded |= to_load
+                return
+            finally:
+                self._inflight = {}
+
+            for (key, field), result in zip(ops, results):
+                if field == "total_tokens":
+                    self._snapshot[key] = int(result)
+            for key, result in zip(load_keys, results[len(ops) :]):
+                self._snapshot[key] = int(result or 0)
+
+            # Totals from previous months are never read again
+            period = f":{_period()}"
+            for key in [key for key in self._snapshot if not key.endswith(period)]:
+                del self._snapshot[key]
+
+            logger.debug(f"Flushed usage for {len(batch)} keys")
+
+    def _requeue(self, batch: Dict[str, Dict[str, int]], events: int) -> None:
+        """Merge a failed batch back into the pending buffer"""
+        for key, fields in batch.items():
+            pending = self._pending[key]
+            for field, amount in fields.items():
+                pending[field] += amount
+        # Each event touches a user and a tenant key, so restore the count once
+        self._pending_events += events
+
+    async def _run(self) -> None:
+        """Flush every interval, or sooner once enough events are buffered"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # Shield so a shutdown mid-flush does not drop the swapped-out batch
+            await asyncio.shield(self.flush())
+
+    def start(self) -> None:
+        """Start the background flush task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and flush anything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+_usage_ledger: Optional[UsageLedger] = None
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Get or create the usage ledger"""
+    global _usage_ledger
+    if _usage_ledger is None:
+        _usage_ledger = UsageLedger()
+    return _usage_ledger
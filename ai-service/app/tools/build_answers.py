@@ -0,0 +1,112 @@
+"""
+Build Answers - precompute answers for canonical starter questions
+
+Generates an answer for each question in a curated list through
+AIProviderService and writes them to an answer store (see
+app.services.answer_store). The running service picks up the new store
+without a restart, so this can run at build time or on a schedule.
+
+Usage:
+    python -m app.tools.build_answers data/starter_questions.json --output answers.store
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.ai_provider import AIProviderService
+from app.services.answer_store import answer_key, write_store
+from app.services.usage_ledger import normalize_usage
+
+logger = logging.getLogger(__name__)
+
+
+def load_questions(path: str) -> List[str]:
+    """Questions from a JSON list or a plain text file with one per line"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return [line.strip() for line in f if line.strip()]
+
+
+async def build_answers(
+    questions: List[str],
+    system_prompt: Optional[str] = None,
+    provider: str = "openai",
+    model: Optional[str] = None,
+    temperature: float = 0.7,
+    max_tokens: int = 1000,
+) -> Dict[str, Dict[str, Any]]:
+    """Generate answers keyed the same way chat requests are looked up"""
+    ai_service = AIProviderService()
+    answers: Dict[str, Dict[str, Any]] = {}
+
+    for question in questions:
+        messages = [{"role": "user", "content": question}]
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
+
+        key = answer_key(messages)
+        if key is None or key in answers:
+            continue
+
+        response = await ai_service.get_completion(
+            messages=messages,
+            provider=provider,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        answers[key] = {
+            "question": question,
+            "message": response["message"],
+            "provider": response["provider"],
+            "model": response["model"],
+            "output_tokens": normalize_usage(response.get("usage", {}))["output_tokens"],
+        }
+        logger.info(f"Answered: {question}")
+
+    return answers
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute answers for starter questions")
+    parser.add_argument("questions", help="question list (.json list or one per line)")
+    parser.add_argument("--output", default=settings.ANSWER_STORE_PATH, help="answer store path")
+    parser.add_argument("--system", help="file containing the system prompt chat requests use")
+    parser.add_argument("--provider", default="openai")
+    parser.add_argument("--model")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if not args.output:
+        parser.error("--output is required when ANSWER_STORE_PATH is not set")
+
+    system_prompt = None
+    if args.system:
+        with open(args.system, encoding="utf-8") as f:
+            system_prompt = f.read()
+
+    logging.basicConfig(level=settings.LOG_LEVEL.upper())
+    answers = asyncio.run(
+        build_answers(
+            load_questions(args.questions),
+            system_prompt=system_prompt,
+            provider=args.provider,
+            model=args.model,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+        )
+    )
+    version = int(time.time())
+    write_store(args.output, answers, version)
+    print(f"Wrote {len(answers)} answers to {args.output} (version {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Traffic Replay - drives this build with a captured load shape
+
+Replays a capture file (see app.services.traffic_capture) against the ai-service
+app in-process, with the provider clients swapped for a simulated upstream that
+sleeps for each request's recorded latency and returns its recorded output size.
+Requests arrive with the recorded inter-arrival times (optionally sped up) and go
+through the real router, limiter and provider code.
+
+WebSocket sessions are replayed as HTTP chat requests, since only the chat route
+is driven in-process. Auth, quotas, the answer store and capture are bypassed, so
+every build is measured on the same path whatever the environment sets.
+
+Requests that were rejected as busy (503) are replayed as the real demand they
+were, with a typical upstream latency; other failed requests are skipped, since
+the simulated upstream would turn them into successes.
+
+Usage (from the ai-service directory of each build):
+    python -m app.tools.replay capture.jsonl.gz --output build-a.json
+    python -m app.tools.replay --compare build-a.json build-b.json
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import statistics
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+from httpx import ASGITransport, AsyncClient
+
+from app.core.config import settings
+from app.core.security import ANONYMOUS, get_identity
+from app.services.answer_store import get_answer_store
+from app.services.traffic_capture import get_traffic_recorder, read_capture
+from app.services.usage_ledger import UsageLedger, get_usage_ledger
+
+# (upstream latency in seconds, output tokens) for the request being replayed
+_simulated: contextvars.ContextVar[Tuple[float, int]] = contextvars.ContextVar(
+    "simulated_upstream", default=(0.0, 1)
+)
+
+
+class _SimulatedCompletions:
+    """Stands in for both openai chat.completions and anthropic messages"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+
+    async def create(self, model: str, messages: List[Dict[str, str]], **kwargs: Any):
+        latency, output_tokens = _simulated.get()
+        await asyncio.sleep(latency)
+        text = "x " * output_tokens
+        input_tokens = sum(len(msg["content"]) for msg in messages) // 4
+
+        if self.provider == "openai":
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                usage=SimpleNamespace(
+                    prompt_tokens=input_tokens,
+                    completion_tokens=output_tokens,
+                    total_tokens=input_tokens + output_tokens,
+                ),
+            )
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=text)],
+            usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens),
+        )
+
+
+class SimulatedOpenAI:
+    def __init__(self, **kwargs: Any):
+        self.chat = SimpleNamespace(completions=_SimulatedCompletions("openai"))
+
+
+class SimulatedAnthropic:
+    def __init__(self, **kwargs: Any):
+        self.messages = _SimulatedCompletions("anthropic")
+
+
+def replayable(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Records whose outcome the simulated upstream can reproduce, in order"""
+    completed = [record for record in records if record["status"] == 200] or [
+        {"upstream_ms": 0.0, "output_tokens": 1}
+    ]
+    typical = {
+        "upstream_ms": statistics.median(record["upstream_ms"] for record in completed),
+        "output_tokens": statistics.median(record["output_tokens"] for record in completed),
+    }
+
+    selected = []
+    for record in records:
+        # 499 is a cancelled stream, which did reach the upstream
+        if record["status"] in (200, 499):
+            selected.append(record)
+        elif record["status"] == 503:
+            selected.append({**record, **typical})
+    return selected
+
+
+def _request_body(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild a chat request of the recorded shape with placeholder content"""
+    return {
+        "messages": [
+            {"role": msg["role"], "content": "x" * max(1, msg["chars"])}
+            for msg in record["messages"]
+        ],
+        "provider": record["provider"],
+        "model": record["model"],
+        "max_tokens": record["max_tokens"],
+        "stream": record["stream"],
+    }
+
+
+async def _send(client: AsyncClient, record: Dict[str, Any]) -> Tuple[float, int]:
+    _simulated.set((record["upstream_ms"] / 1000, max(1, int(record["output_tokens"]))))
+    started = time.monotonic()
+    response = await client.post("/api/v1/chat/", json=_request_body(record))
+    return time.monotonic() - started, response.status_code
+
+
+async def replay(records: List[Dict[str, Any]], speed: float = 1.0) -> Dict[str, Any]:
+    """Replay records with their recorded arrival pattern and summarise the results"""
+    from main import app
+
+    to_send = replayable(records)
+    if not to_send:
+        raise ValueError("capture has no replayable records")
+
+    # Every build is measured on the same path: no auth, quotas, stored answers or capture
+    ledger = UsageLedger(quota_tokens=0, tenant_quota_tokens=0)
+    overrides = {
+        get_identity: lambda: ANONYMOUS,
+        get_usage_ledger: lambda: ledger,
+        get_answer_store: lambda: None,
+        get_traffic_recorder: lambda: None,
+    }
+
+    with (
+        patch.object(settings, "CAPTURE_PATH", None),
+        patch.object(settings, "OPENAI_API_KEY", "replay"),
+        patch.object(settings, "ANTHROPIC_API_KEY", "replay"),
+        patch("app.services.ai_provider.AsyncOpenAI", SimulatedOpenAI),
+        patch("app.services.ai_provider.AsyncAnthropic", SimulatedAnthropic),
+        patch.dict(app.dependency_overrides, overrides),
+    ):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://replay"
+        ) as client:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            first_ts = to_send[0]["ts"]
+            tasks = []
+            for record in to_send:
+                delay = (record["ts"] - first_ts) / speed - (loop.time() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # Each task gets its own context copy, so simulated latencies do not leak
+                tasks.append(asyncio.create_task(_send(client, record)))
+            results = await asyncio.gather(*tasks)
+            duration = loop.time() - started
+
+    return summarise(results, duration, skipped=len(records) - len(to_send))
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summarise(
+    results: List[Tuple[float, int]], duration: float, skipped: int = 0
+) -> Dict[str, Any]:
+    """Latency percentiles (ms), throughput and status counts for a replay run"""
+    latencies = [latency * 1000 for latency, _ in results]
+    statuses: Dict[str, int] = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "requests": len(results),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(results) / duration, 2) if duration > 0 else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 1),
+            "p50": round(_percentile(latencies, 50), 1),
+            "p90": round(_percentile(latencies, 90), 1),
+            "p99": round(_percentile(latencies, 99), 1),
+            "max": round(max(latencies), 1),
+        },
+        "errors": sum(count for status, count in statuses.items() if status != "200"),
+        "statuses": statuses,
+        "skipped": skipped,
+    }
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> List[str]:
+    """Format a side-by-side diff of two replay summaries"""
+
+    def row(name: str, a: Optional[float], b: Optional[float]) -> str:
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else "n/a"
+        return f"{name:<18}{a!s:>12}{b!s:>12}{change:>10}"
+
+    lines = [f"{'metric':<18}{'baseline':>12}{'candidate':>12}{'change':>10}"]
+    lines.append(row("throughput_rps", baseline["throughput_rps"], candidate["throughput_rps"]))
+    for key in ("mean", "p50", "p90", "p99", "max"):
+        lines.append(
+            row(f"latency_{key}_ms", baseline["latency_ms"][key], candidate["latency_ms"][key])
+        )
+    lines.append(row("errors", baseline["errors"], candidate["errors"]))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay captured chat traffic")
+    parser.add_argument("capture", nargs="?", help="capture file (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="arrival time multiplier")
+    parser.add_argument("--limit", type=int, help="replay only the first N records")
+    parser.add_argument("--output", help="write the summary JSON here")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="diff two summaries"
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as a, open(args.compare[1]) as b:
+            print("\n".join(compare(json.load(a), json.load(b))))
+        return
+
+    if not args.capture:
+        parser.error("a capture file is required unless --compare is given")
+
+    records = read_capture(args.capture)[: args.limit]
+    if not records:
+        parser.error("capture file has no records")
+
+    try:
+        summary = asyncio.run(replay(records, speed=args.speed))
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,11 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.v1 import chat, health
+from app.api.v1 import chat, embeddings, health
 from app.core.config import settings
 from app.core.redis_client import get_redis_client
+from app.services.traffic_capture import get_traffic_recorder
+from app.services.usage_ledger import get_usage_ledger
 
 # Configure logging
 logging.basicConfig(
@@ -28,9 +30,18 @@ async def lifespan(app: FastAPI):
     redis_client = await get_redis_client()
     await redis_client.ping()
     logger.info("Redis connection established")
+    usage_ledger = get_usage_ledger()
+    usage_ledger.start()
+    traffic_recorder = get_traffic_recorder()
+    if traffic_recorder is not None:
+        logger.info(f"Capturing traffic to {traffic_recorder.path}")
+        traffic_recorder.start()
     yield
     # Shutdown
     logger.info("Shutting down AI Service...")
+    await usage_ledger.stop()
+    if traffic_recorder is not None:
+        await traffic_recorder.stop()
     await redis_client.close()
 
 
@@ -53,6 +64,7 @@ app.add_middleware(
 # Include routers
 app.include_router(health.router, prefix="/health", tags=["health"])
 app.include_router(chat.router, prefix="/api/v1/chat", tags=["chat"])
+app.include_router(embeddings.router, prefix="/api/v1/embeddings", tags=["embeddings"])
 
 
 @app.get("/")
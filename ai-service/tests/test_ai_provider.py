@@ -0,0 +1,102 @@
+"""
+Tests for AI provider request shaping and usage reporting
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.ai_provider import AIProviderService, _anthropic_system, _openai_messages
+
+LONG_PROMPT = "You are the OffGrid assistant.\r\n" + "Site knowledge. " * 500
+
+MESSAGES = [
+    {"role": "system", "content": LONG_PROMPT + "  "},
+    {"role": "user", "content": "How big should my battery be?"},
+]
+
+
+@pytest.mark.asyncio
+async def test_anthropic_marks_system_prompt_for_caching():
+    """Test the system prompt is sent as a byte-stable cacheable block"""
+    service = AIProviderService()
+    service.anthropic_client = MagicMock()
+    service.anthropic_client.messages.create = AsyncMock(
+        return_value=SimpleNamespace(
+            content=[SimpleNamespace(text="About 10 kWh")],
+            usage=SimpleNamespace(
+                input_tokens=12,
+                output_tokens=8,
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=2048,
+            ),
+        )
+    )
+
+    response = await service.get_completion(MESSAGES, provider="anthropic", model="claude-test")
+
+    kwargs = service.anthropic_client.messages.create.await_args.kwargs
+    (block,) = kwargs["system"]
+    assert block["cache_control"] == {"type": "ephemeral"}
+    assert block["text"] == LONG_PROMPT.replace("\r\n", "\n").strip()
+    assert kwargs["messages"] == [MESSAGES[1]]
+    assert response["usage"]["cached_input_tokens"] == 2048
+    assert response["usage"]["uncached_input_tokens"] == 12
+
+
+@pytest.mark.asyncio
+async def test_openai_puts_system_prompt_first_and_reports_cache_hits():
+    """Test system prompts lead the messages and cached tokens are split out"""
+    service = AIProviderService()
+    service.openai_client = MagicMock()
+    service.openai_client.chat.completions.create = AsyncMock(
+        return_value=SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="About 10 kWh"))],
+            usage=SimpleNamespace(
+                prompt_tokens=2100,
+                completion_tokens=8,
+                total_tokens=2108,
+                prompt_tokens_details={"cached_tokens": 2048},
+            ),
+        )
+    )
+
+    response = await service.get_completion(MESSAGES, provider="openai", model="gpt-test")
+
+    sent = service.openai_client.chat.completions.create.await_args.kwargs["messages"]
+    assert [msg["role"] for msg in sent] == ["system", "user"]
+    assert response["usage"]["cached_input_tokens"] == 2048
+    assert response["usage"]["uncached_input_tokens"] == 52
+    assert response["usage"]["total_tokens"] == 2108
+
+
+def test_later_system_messages_stay_in_place():
+    """Test only the leading system prompt is normalized; later ones keep their position"""
+    messages = [
+        {"role": "system", "content": "Be brief.\r\n"},
+        {"role": "system", "content": "   "},
+        {"role": "user", "content": "Hi"},
+        {"role": "system", "content": "The user is now on the battery page."},
+        {"role": "user", "content": "How big?"},
+    ]
+
+    assert _openai_messages(messages) == [
+        {"role": "system", "content": "Be brief."},
+        *messages[2:],
+    ]
+
+    system, chat_messages = _anthropic_system(messages)
+    assert system == [
+        {"type": "text", "text": "Be brief.", "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "The user is now on the battery page."},
+    ]
+    assert chat_messages == [messages[2], messages[4]]
+
+
+def test_empty_system_prompt_is_dropped():
+    """Test a whitespace-only system prompt does not become an empty cached block"""
+    messages = [{"role": "system", "content": " \r\n "}, {"role": "user", "content": "Hi"}]
+
+    assert _anthropic_system(messages) == (None, [messages[1]])
+    assert _openai_messages(messages) == [messages[1]]
@@ -0,0 +1,157 @@
+"""
+Tests for the precomputed answer store
+"""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.answer_store import (
+    AnswerStore,
+    AnswerStoreWatcher,
+    answer_key,
+    get_answer_store,
+    write_store,
+)
+from app.tools.build_answers import build_answers
+from main import app
+
+
+def make_answer(message):
+    return {
+        "question": "q",
+        "message": message,
+        "provider": "openai",
+        "model": "gpt-4",
+        "output_tokens": 200,
+    }
+
+
+def test_answer_key_normalizes_question():
+    """Test keys ignore case, whitespace and trailing punctuation"""
+    a = answer_key([{"role": "user", "content": "How many  solar panels do I need?"}])
+    b = answer_key([{"role": "user", "content": "how many solar panels do i need"}])
+    assert a == b
+
+
+def test_answer_key_requires_single_user_message():
+    """Test follow-up turns never match a canonical question"""
+    messages = [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello"},
+        {"role": "user", "content": "How many solar panels do I need?"},
+    ]
+    assert answer_key(messages) is None
+
+
+def test_answer_key_includes_system_prompt():
+    """Test answers built for one system prompt are not served under another"""
+    question = {"role": "user", "content": "How big should my battery be?"}
+    plain = answer_key([question])
+    prompted = answer_key([{"role": "system", "content": "Be brief"}, question])
+    assert plain != prompted
+
+
+def test_answer_key_matches_normalized_system_prompt():
+    """Test the key uses the system prompt as it is sent to providers"""
+    question = {"role": "user", "content": "How big should my battery be?"}
+    a = answer_key([{"role": "system", "content": "Be brief\r\n"}, question])
+    b = answer_key(
+        [{"role": "system", "content": "Be brief"}, {"role": "system", "content": " "}, question]
+    )
+    assert a == b
+    assert answer_key([question, {"role": "system", "content": "Be brief"}]) is None
+
+
+def test_watcher_matches_request_settings(tmp_path):
+    """Test answers are only served for a matching provider, model and token budget"""
+    path = str(tmp_path / "answers.store")
+    messages = [{"role": "user", "content": "How do I size an inverter?"}]
+    write_store(path, {answer_key(messages): make_answer("Stored")}, 1)
+    watcher = AnswerStoreWatcher(path, check_interval=0)
+
+    assert watcher.lookup(messages, provider="openai", model=None, max_tokens=1000)
+    assert watcher.lookup(messages, provider="openai", model="gpt-4", max_tokens=200)
+    assert watcher.lookup(messages, provider="anthropic") is None
+    assert watcher.lookup(messages, provider="openai", model="gpt-3.5-turbo") is None
+    assert watcher.lookup(messages, provider="openai", max_tokens=100) is None
+
+
+def test_store_round_trip(tmp_path):
+    """Test every written answer can be looked up and misses return None"""
+    path = str(tmp_path / "answers.store")
+    keys = [answer_key([{"role": "user", "content": f"Question {i}"}]) for i in range(50)]
+    write_store(path, {key: make_answer(f"Answer {i}") for i, key in enumerate(keys)}, 1)
+
+    store = AnswerStore(path)
+    assert store.count == 50
+    for i, key in enumerate(keys):
+        assert store.get(key)["message"] == f"Answer {i}"
+    assert store.get(answer_key([{"role": "user", "content": "Unknown"}])) is None
+    store.close()
+
+
+def test_watcher_hot_swaps_new_store(tmp_path):
+    """Test a replaced store file is served without restarting"""
+    path = str(tmp_path / "answers.store")
+    messages = [{"role": "user", "content": "How do I size an inverter?"}]
+    key = answer_key(messages)
+
+    write_store(path, {key: make_answer("First")}, 1)
+    watcher = AnswerStoreWatcher(path, check_interval=0)
+    assert watcher.lookup(messages)["message"] == "First"
+
+    write_store(path, {key: make_answer("Second")}, 2)
+    answer = watcher.lookup(messages)
+    assert answer["message"] == "Second"
+    assert answer["version"] == 2
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_serves_precomputed_answer(tmp_path):
+    """Test canonical questions are answered without calling the provider"""
+    path = str(tmp_path / "answers.store")
+    messages = [{"role": "user", "content": "How much rainwater can I harvest?"}]
+    write_store(path, {answer_key(messages): make_answer("Precomputed")}, 7)
+    app.dependency_overrides[get_answer_store] = lambda: AnswerStoreWatcher(path)
+
+    try:
+        with patch("app.api.v1.chat.AIProviderService") as mock_service:
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                response = await client.post("/api/v1/chat/", json={"messages": messages})
+
+            mock_service.assert_not_called()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["message"] == "Precomputed"
+    assert data["usage"]["store_version"] == 7
+
+
+@pytest.mark.asyncio
+async def test_build_answers_keys_match_chat_lookup():
+    """Test built answers use the same keys as chat requests with the system prompt"""
+    with patch("app.tools.build_answers.AIProviderService") as mock_service:
+        mock_instance = AsyncMock()
+        mock_instance.get_completion.return_value = {
+            "message": "Generated",
+            "provider": "openai",
+            "model": "gpt-4",
+            "usage": {"prompt_tokens": 20, "completion_tokens": 42},
+        }
+        mock_service.return_value = mock_instance
+
+        answers = await build_answers(["What size inverter?", "what size inverter"], "Be brief")
+
+    assert mock_instance.get_completion.await_count == 1
+    key = answer_key(
+        [
+            {"role": "system", "content": "Be brief"},
+            {"role": "user", "content": "What size inverter?"},
+        ]
+    )
+    assert answers[key]["message"] == "Generated"
+    assert answers[key]["output_tokens"] == 42
@@ -237,3 +237,76 @@ async def test_chat_endpoint_internal_error():
             response = await client.post("/api/v1/chat/", json=request_data)
             assert response.status_code == 500
             assert "Internal server error" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_quota_exceeded():
+    """Test chat endpoint rejects users over their token quota"""
+    import jwt
+
+    from app.core.config import settings
+    from app.core.security import Identity
+    from app.services.usage_ledger import UsageLedger, get_usage_ledger
+
+    ledger = UsageLedger(quota_tokens=10)
+    ledger.record(
+        Identity(user_id="heavy-user", tenant_id="acme"), "openai", "gpt-4", {"total_tokens": 50}
+    )
+    app.dependency_overrides[get_usage_ledger] = lambda: ledger
+    token = jwt.encode(
+        {"sub": "heavy-user", "tenant": "acme"},
+        settings.JWT_SECRET,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            request_data = {
+                "messages": [
+                    {"role": "user", "content": "Test"},
+                ],
+            }
+
+            response = await client.post(
+                "/api/v1/chat/", json=request_data, headers={"Authorization": f"Bearer {token}"}
+            )
+            assert response.status_code == 429
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_rejects_invalid_token():
+    """Test chat endpoint returns 401 for a bearer token it cannot verify"""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        request_data = {
+            "messages": [
+                {"role": "user", "content": "Test"},
+            ],
+        }
+
+        response = await client.post(
+            "/api/v1/chat/", json=request_data, headers={"Authorization": "Bearer not-a-jwt"}
+        )
+        assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_provider_busy():
+    """Test chat endpoint returns 503 when the upstream concurrency limit is reached"""
+    from app.services.concurrency_limiter import ConcurrencyLimitExceeded
+
+    with patch("app.api.v1.chat.AIProviderService") as mock_service:
+        mock_instance = AsyncMock()
+        mock_instance.get_completion.side_effect = ConcurrencyLimitExceeded("limit reached")
+        mock_service.return_value = mock_instance
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            request_data = {
+                "messages": [
+                    {"role": "user", "content": "Test"},
+                ],
+            }
+
+            response = await client.post("/api/v1/chat/", json=request_data)
+            assert response.status_code == 503
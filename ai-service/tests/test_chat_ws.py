@@ -0,0 +1,176 @@
+"""
+Tests for chat WebSocket endpoint
+"""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+def make_stream(tokens, delay=0.0):
+    """Build a fake stream_completion that yields tokens then a done event"""
+    calls = []
+
+    async def stream_completion(messages, provider, model, temperature, max_tokens):
+        calls.append(messages)
+        for token in tokens:
+            await asyncio.sleep(delay)
+            yield {"type": "token", "content": token}
+        yield {"type": "done", "provider": provider, "model": "gpt-4", "usage": {}}
+
+    return stream_completion, calls
+
+
+def receive_reply(websocket):
+    """Collect token frames until a terminal frame arrives"""
+    text = ""
+    while True:
+        frame = websocket.receive_json()
+        if frame["type"] != "token":
+            return text, frame
+        text += frame["content"]
+
+
+def test_chat_websocket_streams_tokens():
+    """Test tokens are streamed followed by a done frame"""
+    stream_completion, _ = make_stream(["Hello", ", ", "world"])
+
+    with patch("app.api.v1.chat.AIProviderService") as mock_service:
+        mock_instance = MagicMock()
+        mock_instance.stream_completion = stream_completion
+        mock_service.return_value = mock_instance
+
+        with TestClient(app).websocket_connect("/api/v1/chat/ws") as websocket:
+            websocket.send_json({"type": "message", "content": "Hi"})
+            text, frame = receive_reply(websocket)
+
+    assert text == "Hello, world"
+    assert frame["type"] == "done"
+    assert frame["provider"] == "openai"
+
+
+def test_chat_websocket_keeps_history():
+    """Test follow-up messages are sent with the conversation so far"""
+    stream_completion, calls = make_stream(["Sure"])
+
+    with patch("app.api.v1.chat.AIProviderService") as mock_service:
+        mock_instance = MagicMock()
+        mock_instance.stream_completion = stream_completion
+        mock_service.return_value = mock_instance
+
+        with TestClient(app).websocket_connect("/api/v1/chat/ws") as websocket:
+            websocket.send_json(
+                {"type": "reset", "messages": [{"role": "system", "content": "Be brief"}]}
+            )
+            websocket.send_json({"type": "message", "content": "First"})
+            receive_reply(websocket)
+            websocket.send_json({"type": "message", "content": "Second"})
+            receive_reply(websocket)
+
+    assert calls[1] == [
+        {"role": "system", "content": "Be brief"},
+        {"role": "user", "content": "First"},
+        {"role": "assistant", "content": "Sure"},
+        {"role": "user", "content": "Second"},
+    ]
+
+
+def test_chat_websocket_cancel():
+    """Test an in-progress generation can be cancelled"""
+    stream_completion, _ = make_stream(["slow"] * 100, delay=0.05)
+
+    with patch("app.api.v1.chat.AIProviderService") as mock_service:
+        mock_instance = MagicMock()
+        mock_instance.stream_completion = stream_completion
+        mock_service.return_value = mock_instance
+
+        with TestClient(app).websocket_connect("/api/v1/chat/ws") as websocket:
+            websocket.send_json({"type": "message", "content": "Tell me a long story"})
+            assert websocket.receive_json()["type"] == "token"
+            websocket.send_json({"type": "cancel"})
+            _, frame = receive_reply(websocket)
+
+    assert frame["type"] == "cancelled"
+
+
+def test_chat_websocket_cancel_keeps_sent_text_and_usage():
+    """Test a cancelled reply is kept only as far as it was sent and its usage is recorded"""
+    from app.core.security import ANONYMOUS
+    from app.services.usage_ledger import UsageLedger, get_usage_ledger
+
+    stream_completion, calls = make_stream(["slow "] * 100, delay=0.05)
+    ledger = UsageLedger(quota_tokens=0)
+    app.dependency_overrides[get_usage_ledger] = lambda: ledger
+
+    try:
+        with patch("app.api.v1.chat.AIProviderService") as mock_service:
+            mock_instance = MagicMock()
+            mock_instance.stream_completion = stream_completion
+            mock_service.return_value = mock_instance
+
+            with TestClient(app).websocket_connect("/api/v1/chat/ws") as websocket:
+                websocket.send_json({"type": "message", "content": "Tell me a long story"})
+                received = websocket.receive_json()["content"]
+                websocket.send_json({"type": "cancel"})
+                text, _ = receive_reply(websocket)
+                websocket.send_json({"type": "message", "content": "Go on"})
+                receive_reply(websocket)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert calls[1][1] == {"role": "assistant", "content": received + text}
+    assert ledger.used_tokens(ANONYMOUS) > 0
+
+
+def test_chat_websocket_error_discards_failed_turn():
+    """Test a reply that fails partway is not kept and the next turn starts clean"""
+    calls = []
+
+    async def stream_completion(messages, provider, model, temperature, max_tokens):
+        calls.append(messages)
+        if len(calls) == 1:
+            yield {"type": "token", "content": "Half an ans"}
+            raise RuntimeError("upstream connection reset")
+        yield {"type": "token", "content": "Full answer"}
+        yield {"type": "done", "provider": provider, "model": "gpt-4", "usage": {}}
+
+    with patch("app.api.v1.chat.AIProviderService") as mock_service:
+        mock_instance = MagicMock()
+        mock_instance.stream_completion = stream_completion
+        mock_service.return_value = mock_instance
+
+        with TestClient(app).websocket_connect("/api/v1/chat/ws") as websocket:
+            websocket.send_json({"type": "message", "content": "First"})
+            _, frame = receive_reply(websocket)
+            assert frame["type"] == "error"
+            websocket.send_json({"type": "message", "content": "First, again"})
+            _, frame = receive_reply(websocket)
+            assert frame["type"] == "done"
+
+    assert calls[1] == [{"role": "user", "content": "First, again"}]
+
+
+def test_chat_websocket_binary_frame():
+    """Test binary frames are reported as invalid without closing the connection"""
+    with patch("app.api.v1.chat.AIProviderService"):
+        with TestClient(app).websocket_connect("/api/v1/chat/ws") as websocket:
+            websocket.send_bytes(b"\x00\x01")
+            frame = websocket.receive_json()
+            websocket.send_json({"type": "bogus"})
+            assert websocket.receive_json()["type"] == "error"
+
+    assert frame == {"type": "error", "detail": "Invalid frame"}
+
+
+def test_chat_websocket_invalid_frame():
+    """Test unknown frames are reported without closing the connection"""
+    with patch("app.api.v1.chat.AIProviderService"):
+        with TestClient(app).websocket_connect("/api/v1/chat/ws") as websocket:
+            websocket.send_json({"type": "bogus"})
+            frame = websocket.receive_json()
+
+    assert frame["type"] == "error"
+    assert "Unknown frame type" in frame["detail"]
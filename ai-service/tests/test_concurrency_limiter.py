@@ -0,0 +1,157 @@
+"""
+Tests for the adaptive concurrency limiter
+"""
+
+import asyncio
+import random
+from unittest.mock import patch
+
+import pytest
+
+from app.services import concurrency_limiter
+from app.services.concurrency_limiter import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimitExceeded,
+    get_limiter,
+    is_capacity_error,
+)
+
+
+class StatusError(Exception):
+    """Provider SDK style error carrying an HTTP status"""
+
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def make_limiter(**kwargs):
+    options = {
+        "name": "test/model",
+        "initial_limit": 2,
+        "min_limit": 1,
+        "max_limit": 10,
+        "latency_tolerance": 2.0,
+        "queue_timeout_ms": 50,
+    }
+    options.update(kwargs)
+    return AdaptiveConcurrencyLimiter(**options)
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_on_fast_successes():
+    """Test the limit increases while it is being used and latency stays flat"""
+    limiter = make_limiter()
+
+    for _ in range(20):
+        async with limiter.acquire() as slot:
+            slot.latency = 0.1
+
+    assert limiter.current_limit > 2
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_when_latency_tracks_reply_length():
+    """Test replies of varying length on an unsaturated upstream do not shrink the limit"""
+    limiter = make_limiter(initial_limit=4, max_limit=100)
+    rng = random.Random(0)
+
+    async def client():
+        for _ in range(250):
+            async with limiter.acquire() as slot:
+                await asyncio.sleep(0)
+                # 20-800 output tokens at 30 tokens/s, independent of concurrency
+                slot.work = rng.randint(20, 800)
+                slot.latency = slot.work / 30
+
+    await asyncio.gather(*(client() for _ in range(8)))
+
+    assert limiter.current_limit > 4
+
+
+@pytest.mark.asyncio
+async def test_limit_backs_off_on_slow_responses():
+    """Test latency well above baseline shrinks the limit"""
+    limiter = make_limiter(initial_limit=8)
+
+    async with limiter.acquire() as slot:
+        slot.latency = 0.1
+    for _ in range(5):
+        async with limiter.acquire() as slot:
+            slot.latency = 1.0
+
+    assert limiter.current_limit < 8
+
+
+@pytest.mark.asyncio
+async def test_limit_halves_on_upstream_error():
+    """Test capacity errors cut the limit but request errors do not"""
+    limiter = make_limiter(initial_limit=8)
+
+    with pytest.raises(ValueError):
+        async with limiter.acquire():
+            raise ValueError("bad request")
+    with pytest.raises(StatusError):
+        async with limiter.acquire():
+            raise StatusError(400)
+    assert limiter.current_limit == 8
+
+    with pytest.raises(StatusError):
+        async with limiter.acquire():
+            raise StatusError(500)
+    assert limiter.current_limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_is_capacity_error():
+    """Test only 429, 5xx and timeouts count as capacity signals"""
+    assert is_capacity_error(StatusError(429))
+    assert is_capacity_error(StatusError(503))
+    assert is_capacity_error(TimeoutError())
+    assert not is_capacity_error(StatusError(400))
+    assert not is_capacity_error(StatusError(404))
+    assert not is_capacity_error(RuntimeError("parse failure"))
+
+
+def test_limiters_are_bounded():
+    """Test the least recently used idle limiter is dropped once the cap is reached"""
+    with (
+        patch.dict(concurrency_limiter._limiters, clear=True),
+        patch.object(concurrency_limiter.settings, "CONCURRENCY_MAX_LIMITERS", 2),
+    ):
+        first = get_limiter("openai", "a")
+        get_limiter("openai", "b")
+        first.in_flight = 1
+        get_limiter("openai", "c")
+
+        assert set(concurrency_limiter._limiters) == {("openai", "a"), ("openai", "c")}
+        assert get_limiter("openai", "a") is first
+
+
+@pytest.mark.asyncio
+async def test_requests_over_limit_wait_then_reject():
+    """Test requests queue briefly for a slot and are rejected after the timeout"""
+    limiter = make_limiter(initial_limit=1)
+    release = asyncio.Event()
+
+    async def hold_slot():
+        async with limiter.acquire():
+            await release.wait()
+
+    holder = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0)
+
+    with pytest.raises(ConcurrencyLimitExceeded):
+        async with limiter.acquire():
+            pass
+    assert limiter.stats()["rejected"] == 1
+
+    async def wait_for_slot():
+        async with limiter.acquire():
+            return limiter.in_flight
+
+    waiter = asyncio.create_task(wait_for_slot())
+    await asyncio.sleep(0.01)
+    release.set()
+    await holder
+    assert await asyncio.wait_for(waiter, timeout=1) == 1
@@ -0,0 +1,196 @@
+"""
+Tests for embeddings API and micro-batching
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.redis_client import get_redis_client
+from app.services.embedding_batcher import EmbeddingBatcher, get_embedding_batcher
+from main import app
+
+
+def fake_embeddings(texts, provider, model):
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+class StatusError(Exception):
+    """Provider SDK style error carrying an HTTP status"""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeRedis:
+    """Just enough of redis for the embedding cache"""
+
+    def __init__(self):
+        self.store = {}
+
+    async def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def execute(self):
+        return []
+
+
+@pytest.mark.asyncio
+async def test_batcher_coalesces_concurrent_requests():
+    """Test concurrent single-text requests share one upstream call"""
+    batcher = EmbeddingBatcher(max_batch_size=64, max_wait_ms=5)
+
+    with patch("app.services.embedding_batcher.AIProviderService") as mock_service:
+        mock_instance = AsyncMock()
+        mock_instance.get_embeddings.side_effect = fake_embeddings
+        mock_service.return_value = mock_instance
+
+        results = await asyncio.gather(
+            *(batcher.embed(text, "openai", "m") for text in ["a", "bb", "a", "ccc"])
+        )
+
+    assert results == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [3.0, 1.0]]
+    mock_instance.get_embeddings.assert_awaited_once()
+    # Duplicate texts are embedded once
+    assert mock_instance.get_embeddings.await_args.args[0] == ["a", "bb", "ccc"]
+
+
+@pytest.mark.asyncio
+async def test_batcher_splits_at_max_batch_size():
+    """Test a full batch is dispatched without waiting for the window"""
+    batcher = EmbeddingBatcher(max_batch_size=2, max_wait_ms=1000)
+
+    with patch("app.services.embedding_batcher.AIProviderService") as mock_service:
+        mock_instance = AsyncMock()
+        mock_instance.get_embeddings.side_effect = fake_embeddings
+        mock_service.return_value = mock_instance
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed(text, "openai", "m") for text in ["a", "b"])),
+            timeout=0.5,
+        )
+
+    assert len(results) == 2
+    assert mock_instance.get_embeddings.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_batcher_propagates_upstream_errors():
+    """Test every caller in a failed batch sees the error"""
+    batcher = EmbeddingBatcher(max_batch_size=64, max_wait_ms=1)
+
+    with patch("app.services.embedding_batcher.AIProviderService") as mock_service:
+        mock_instance = AsyncMock()
+        mock_instance.get_embeddings.side_effect = ValueError("OpenAI API key not configured")
+        mock_service.return_value = mock_instance
+
+        with pytest.raises(ValueError):
+            await batcher.embed("a", "openai", "m")
+
+
+@pytest.mark.asyncio
+async def test_batcher_isolates_bad_text():
+    """Test a text that fails the batch only fails its own caller"""
+    batcher = EmbeddingBatcher(max_batch_size=64, max_wait_ms=1)
+
+    def embeddings(texts, provider, model):
+        if "bad" in texts:
+            raise StatusError(400, "input too long")
+        return fake_embeddings(texts, provider, model)
+
+    with patch("app.services.embedding_batcher.AIProviderService") as mock_service:
+        mock_instance = AsyncMock()
+        mock_instance.get_embeddings.side_effect = embeddings
+        mock_service.return_value = mock_instance
+
+        results = await asyncio.gather(
+            *(batcher.embed(text, "openai", "m") for text in ["a", "bad", "cc"]),
+            return_exceptions=True,
+        )
+
+    assert results[0] == [1.0, 1.0]
+    assert isinstance(results[1], StatusError)
+    assert results[2] == [2.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_batcher_fails_batch_once_for_whole_call_errors():
+    """Test errors that hit every text, like an unknown model, are not retried per text"""
+    batcher = EmbeddingBatcher(max_batch_size=64, max_wait_ms=1)
+
+    with patch("app.services.embedding_batcher.AIProviderService") as mock_service:
+        mock_instance = AsyncMock()
+        mock_instance.get_embeddings.side_effect = StatusError(404, "model not found")
+        mock_service.return_value = mock_instance
+
+        results = await asyncio.gather(
+            *(batcher.embed(f"text {i}", "ollama", "bogus") for i in range(20)),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(result, StatusError) for result in results)
+    assert mock_instance.get_embeddings.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_embeddings_endpoint_validates_texts():
+    """Test empty, over-long and too many texts are rejected before batching"""
+    from app.api.v1.embeddings import MAX_INPUTS
+    from app.core.config import settings
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        for body in (
+            {"input": ""},
+            {"input": ["ok", "   "]},
+            {"input": []},
+            {"input": ["x"] * (MAX_INPUTS + 1)},
+            {"input": "x" * (settings.EMBEDDING_MAX_CHARS + 1)},
+        ):
+            response = await client.post("/api/v1/embeddings/", json=body)
+            assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_embeddings_endpoint_uses_cache():
+    """Test repeated texts are served from the cache without upstream calls"""
+    fake_redis = FakeRedis()
+    app.dependency_overrides[get_redis_client] = lambda: fake_redis
+    app.dependency_overrides[get_embedding_batcher] = lambda: EmbeddingBatcher(max_wait_ms=1)
+
+    try:
+        with patch("app.services.embedding_batcher.AIProviderService") as mock_service:
+            mock_instance = AsyncMock()
+            mock_instance.get_embeddings.side_effect = fake_embeddings
+            mock_service.return_value = mock_instance
+
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                first = await client.post("/api/v1/embeddings/", json={"input": ["hi", "there"]})
+                second = await client.post("/api/v1/embeddings/", json={"input": "hi"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first.status_code == 200
+    assert first.json()["embeddings"] == [[2.0, 1.0], [5.0, 1.0]]
+    assert first.json()["cached"] == 0
+    assert second.json()["embeddings"] == [[2.0, 1.0]]
+    assert second.json()["cached"] == 1
+    assert mock_instance.get_embeddings.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_embeddings_endpoint_invalid_provider():
+    """Test embeddings endpoint rejects providers without embedding support"""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/v1/embeddings/", json={"input": "hi", "provider": "anthropic"}
+        )
+        assert response.status_code == 400
@@ -0,0 +1,225 @@
+"""
+Tests for traffic capture and replay
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.traffic_capture import TrafficRecorder, get_traffic_recorder, read_capture
+from app.tools.replay import compare, replay, replayable
+from main import app
+
+
+@pytest.mark.asyncio
+async def test_recorder_appends_redacted_records(tmp_path):
+    """Test records are appended across flushes without message content"""
+    path = str(tmp_path / "capture.jsonl.gz")
+    recorder = TrafficRecorder(path)
+
+    for i in range(2):
+        recorder.record(
+            arrived_at=1000.0 + i,
+            transport="http",
+            messages=[{"role": "user", "content": "secret question"}],
+            provider="openai",
+            model="gpt-4",
+            stream=False,
+            max_tokens=100,
+            upstream_ms=250.0,
+            status=200,
+            usage={"prompt_tokens": 5, "completion_tokens": 7},
+        )
+        await recorder.flush()
+
+    records = read_capture(path)
+    assert len(records) == 2
+    assert records[0]["messages"][0]["chars"] == len("secret question")
+    assert records[0]["output_tokens"] == 7
+    assert "secret" not in str(records)
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_captures_request(tmp_path):
+    """Test chat requests are recorded when capture is enabled"""
+    recorder = TrafficRecorder(str(tmp_path / "capture.jsonl.gz"))
+    app.dependency_overrides[get_traffic_recorder] = lambda: recorder
+
+    try:
+        with patch("app.api.v1.chat.AIProviderService") as mock_service:
+            mock_instance = AsyncMock()
+            mock_instance.get_completion.return_value = {
+                "message": "Hi",
+                "provider": "openai",
+                "model": "gpt-4",
+                "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+            }
+            mock_instance.upstream_ms = 12.5
+            mock_service.return_value = mock_instance
+
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                request_data = {"messages": [{"role": "user", "content": "Hello"}]}
+                response = await client.post("/api/v1/chat/", json=request_data)
+                assert response.status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+    await recorder.flush()
+    (record,) = read_capture(recorder.path)
+    assert record["transport"] == "http"
+    assert record["status"] == 200
+    assert record["upstream_ms"] == 12.5
+    assert record["output_tokens"] == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_captures_busy_without_queue_time(tmp_path):
+    """Test a request rejected by the limiter is recorded with no upstream latency"""
+    from app.services.concurrency_limiter import AdaptiveConcurrencyLimiter
+
+    recorder = TrafficRecorder(str(tmp_path / "capture.jsonl.gz"))
+    app.dependency_overrides[get_traffic_recorder] = lambda: recorder
+    # Every slot is taken, so the request queues until the limiter gives up
+    limiter = AdaptiveConcurrencyLimiter(name="openai/gpt-4", initial_limit=1, queue_timeout_ms=50)
+    limiter.in_flight = 1
+
+    try:
+        with patch("app.services.ai_provider.get_limiter", return_value=limiter):
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                request_data = {"messages": [{"role": "user", "content": "Hello"}]}
+                response = await client.post("/api/v1/chat/", json=request_data)
+                assert response.status_code == 503
+    finally:
+        app.dependency_overrides.clear()
+
+    await recorder.flush()
+    (record,) = read_capture(recorder.path)
+    assert record["status"] == 503
+    assert record["upstream_ms"] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_flushes_do_not_interleave(tmp_path):
+    """Test a flush started while another is writing waits for it"""
+    path = str(tmp_path / "capture.jsonl.gz")
+    recorder = TrafficRecorder(path)
+    writes = []
+
+    def write(batch):
+        writes.append(("start", len(batch)))
+        time.sleep(0.05)
+        writes.append(("end", len(batch)))
+
+    recorder._write = write
+    for _ in range(3):
+        recorder.record(
+            arrived_at=1000.0,
+            transport="http",
+            messages=[],
+            provider="openai",
+            model="gpt-4",
+            stream=False,
+            max_tokens=100,
+            upstream_ms=1.0,
+            status=200,
+        )
+    first = asyncio.create_task(recorder.flush())
+    await asyncio.sleep(0.01)
+    recorder.record(
+        arrived_at=1001.0,
+        transport="http",
+        messages=[],
+        provider="openai",
+        model="gpt-4",
+        stream=False,
+        max_tokens=100,
+        upstream_ms=1.0,
+        status=200,
+    )
+    await asyncio.gather(first, recorder.flush())
+
+    assert writes == [("start", 3), ("end", 3), ("start", 1), ("end", 1)]
+
+
+@pytest.mark.asyncio
+async def test_replay_honours_recorded_latency():
+    """Test replay drives the chat route against the simulated upstream"""
+    now = time.time()
+    records = [
+        {
+            "ts": now + i * 0.01,
+            "transport": "http",
+            "provider": "openai",
+            "model": "gpt-4-replay",
+            "stream": False,
+            "max_tokens": 50,
+            "messages": [{"role": "user", "chars": 20, "sha256": "0"}],
+            "upstream_ms": 50.0,
+            "output_tokens": 5,
+            "status": 200,
+        }
+        for i in range(3)
+    ]
+
+    summary = await replay(records)
+
+    assert summary["requests"] == 3
+    assert summary["errors"] == 0
+    assert summary["latency_ms"]["p50"] >= 50
+    assert len(compare(summary, summary)) == 8
+
+
+@pytest.mark.asyncio
+async def test_replay_bypasses_auth_and_quotas():
+    """Test replay results do not depend on the environment's auth and quota settings"""
+    from app.core.config import settings
+    from app.core.security import ANONYMOUS
+    from app.services.usage_ledger import UsageLedger, get_usage_ledger
+
+    exhausted = UsageLedger(quota_tokens=1)
+    exhausted.record(ANONYMOUS, "openai", "gpt-4", {"total_tokens": 10})
+    app.dependency_overrides[get_usage_ledger] = lambda: exhausted
+    records = [
+        {
+            "ts": time.time(),
+            "transport": "http",
+            "provider": "openai",
+            "model": "gpt-4-replay",
+            "stream": False,
+            "max_tokens": 50,
+            "messages": [{"role": "user", "chars": 20, "sha256": "0"}],
+            "upstream_ms": 1.0,
+            "output_tokens": 5,
+            "status": 200,
+        }
+    ]
+
+    try:
+        with patch.object(settings, "REQUIRE_AUTH", True):
+            summary = await replay(records)
+        assert app.dependency_overrides[get_usage_ledger]() is exhausted
+    finally:
+        app.dependency_overrides.clear()
+
+    assert summary["statuses"] == {"200": 1}
+
+
+def test_replay_skips_failed_records():
+    """Test failed requests are not replayed as successes and busy ones keep their demand"""
+    base = {"ts": 0.0, "output_tokens": 10}
+    records = [
+        {**base, "status": 200, "upstream_ms": 100.0},
+        {**base, "status": 200, "upstream_ms": 300.0},
+        {**base, "status": 400, "upstream_ms": 0.0},
+        {**base, "status": 500, "upstream_ms": 50.0},
+        {**base, "status": 503, "upstream_ms": 0.0, "output_tokens": 0},
+    ]
+
+    selected = replayable(records)
+
+    assert [record["status"] for record in selected] == [200, 200, 503]
+    assert selected[2]["upstream_ms"] == 200.0
+    assert selected[2]["output_tokens"] == 10
@@ -0,0 +1,205 @@
+"""
+Tests for the usage ledger
+"""
+
+from collections import defaultdict
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.security import Identity
+from app.services.usage_ledger import UsageLedger, normalize_usage, usage_key
+
+ALICE = Identity(user_id="alice", tenant_id="acme")
+BOB = Identity(user_id="bob", tenant_id="acme")
+
+
+class FakePipeline:
+    """Minimal stand-in for a Redis pipeline backed by a dict of hashes"""
+
+    def __init__(self, store):
+        self.store = store
+        self.ops = []
+
+    def hincrby(self, key, field, amount):
+        self.ops.append(("hincrby", key, field, amount))
+
+    def expire(self, key, ttl):
+        self.ops.append(("expire", key, ttl))
+
+    def hget(self, key, field):
+        self.ops.append(("hget", key, field))
+
+    async def execute(self):
+        results = []
+        for op in self.ops:
+            if op[0] == "hincrby":
+                _, key, field, amount = op
+                self.store[key][field] += amount
+                results.append(self.store[key][field])
+            elif op[0] == "expire":
+                results.append(True)
+            else:
+                _, key, field = op
+                results.append(self.store[key].get(field))
+        return results
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = defaultdict(lambda: defaultdict(int))
+        self.pipelines = 0
+
+    def pipeline(self, transaction=True):
+        self.pipelines += 1
+        return FakePipeline(self.store)
+
+
+def test_normalize_usage_openai_and_anthropic():
+    """Test both provider usage shapes map onto the same counters"""
+    assert normalize_usage({"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30}) == {
+        "input_tokens": 10,
+        "output_tokens": 20,
+        "total_tokens": 30,
+        "cached_input_tokens": 0,
+    }
+    assert normalize_usage({"input_tokens": 15, "output_tokens": 25}) == {
+        "input_tokens": 15,
+        "output_tokens": 25,
+        "total_tokens": 40,
+        "cached_input_tokens": 0,
+    }
+
+
+def test_normalize_usage_counts_prompt_cache_hits():
+    """Test Anthropic cache reads are included in the input total"""
+    usage = {
+        "input_tokens": 10,
+        "output_tokens": 5,
+        "cache_creation_input_tokens": 0,
+        "cached_input_tokens": 2000,
+        "uncached_input_tokens": 10,
+    }
+    assert normalize_usage(usage) == {
+        "input_tokens": 2010,
+        "output_tokens": 5,
+        "total_tokens": 2015,
+        "cached_input_tokens": 2000,
+    }
+
+
+@pytest.mark.asyncio
+async def test_flush_batches_into_one_pipeline():
+    """Test buffered usage is written in a single pipelined flush"""
+    fake_redis = FakeRedis()
+    ledger = UsageLedger(flush_interval_ms=1000, flush_max_events=100, quota_tokens=0)
+
+    ledger.record(ALICE, "openai", "gpt-4", {"prompt_tokens": 10, "completion_tokens": 5})
+    ledger.record(ALICE, "openai", "gpt-4", {"prompt_tokens": 1, "completion_tokens": 2})
+    ledger.record(BOB, "anthropic", "claude", {"input_tokens": 7, "output_tokens": 3})
+    assert fake_redis.pipelines == 0
+
+    with patch("app.services.usage_ledger.get_redis_client", AsyncMock(return_value=fake_redis)):
+        await ledger.flush()
+
+    assert fake_redis.pipelines == 1
+    alice = fake_redis.store[usage_key("acme", "alice")]
+    assert alice["total_tokens"] == 18
+    assert alice["requests"] == 2
+    assert alice["openai:gpt-4:total_tokens"] == 18
+    assert fake_redis.store[usage_key("acme", "bob")]["total_tokens"] == 10
+    assert fake_redis.store[usage_key("acme")]["total_tokens"] == 28
+    assert fake_redis.store[usage_key("acme")]["requests"] == 3
+    assert ledger.used_tokens(ALICE) == 18
+    assert ledger.tenant_used_tokens("acme") == 28
+
+
+@pytest.mark.asyncio
+async def test_quota_uses_cached_snapshot_and_pending():
+    """Test quota checks combine the Redis snapshot with unflushed usage"""
+    fake_redis = FakeRedis()
+    fake_redis.store[usage_key("acme", "carol")]["total_tokens"] = 90
+    ledger = UsageLedger(flush_interval_ms=1000, flush_max_events=100, quota_tokens=100)
+
+    # Unknown user is allowed and scheduled for a snapshot load
+    assert ledger.check_quota(Identity(user_id="carol", tenant_id="acme"))
+
+    with patch("app.services.usage_ledger.get_redis_client", AsyncMock(return_value=fake_redis)):
+        await ledger.flush()
+
+    assert ledger.used_tokens(Identity(user_id="carol", tenant_id="acme")) == 90
+    assert ledger.check_quota(Identity(user_id="carol", tenant_id="acme"))
+
+    ledger.record(
+        Identity(user_id="carol", tenant_id="acme"), "openai", "gpt-4", {"total_tokens": 15}
+    )
+    assert not ledger.check_quota(Identity(user_id="carol", tenant_id="acme"))
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_requeues_usage():
+    """Test usage is kept for the next flush when Redis is unavailable"""
+    ledger = UsageLedger(flush_interval_ms=1000, flush_max_events=100, quota_tokens=0)
+    ledger.record(
+        Identity(user_id="dave", tenant_id="acme"), "openai", "gpt-4", {"total_tokens": 12}
+    )
+
+    with patch(
+        "app.services.usage_ledger.get_redis_client",
+        AsyncMock(side_effect=ConnectionError("redis down")),
+    ):
+        await ledger.flush()
+
+    assert ledger.used_tokens(Identity(user_id="dave", tenant_id="acme")) == 12
+    # One event, even though it wrote a user and a tenant key
+    assert ledger._pending_events == 1
+
+    fake_redis = FakeRedis()
+    with patch("app.services.usage_ledger.get_redis_client", AsyncMock(return_value=fake_redis)):
+        await ledger.flush()
+
+    assert fake_redis.store[usage_key("acme", "dave")]["total_tokens"] == 12
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_remaining_usage():
+    """Test graceful shutdown writes out buffered usage"""
+    fake_redis = FakeRedis()
+    ledger = UsageLedger(flush_interval_ms=60000, flush_max_events=100, quota_tokens=0)
+
+    with patch("app.services.usage_ledger.get_redis_client", AsyncMock(return_value=fake_redis)):
+        ledger.start()
+        ledger.record(
+            Identity(user_id="erin", tenant_id="acme"), "openai", "gpt-4", {"total_tokens": 4}
+        )
+        await ledger.stop()
+
+    assert fake_redis.store[usage_key("acme", "erin")]["total_tokens"] == 4
+
+
+def test_tenant_quota_applies_across_users():
+    """Test one user's usage counts towards the quota of everyone in the tenant"""
+    ledger = UsageLedger(quota_tokens=100, tenant_quota_tokens=50)
+    ledger.record(ALICE, "openai", "gpt-4", {"total_tokens": 60})
+
+    assert ledger.used_tokens(BOB) == 0
+    assert not ledger.check_quota(BOB)
+    assert ledger.check_quota(Identity(user_id="bob", tenant_id="other"))
+
+
+@pytest.mark.asyncio
+async def test_flush_evicts_previous_month_snapshots():
+    """Test cached totals from earlier months are dropped on flush"""
+    from datetime import datetime, timezone
+
+    fake_redis = FakeRedis()
+    ledger = UsageLedger(flush_interval_ms=1000, flush_max_events=100, quota_tokens=100)
+    stale = usage_key("acme", "alice", now=datetime(2020, 1, 1, tzinfo=timezone.utc))
+    ledger._snapshot[stale] = 40
+    ledger.record(ALICE, "openai", "gpt-4", {"total_tokens": 5})
+
+    with patch("app.services.usage_ledger.get_redis_client", AsyncMock(return_value=fake_redis)):
+        await ledger.flush()
+
+    assert stale not in ledger._snapshot
+    assert ledger._snapshot[usage_key("acme", "alice")] == 5